@@ -15,15 +15,52 @@ class Settings:
 
     # Model configurations
     LLM_MODEL = "llama-3.1-8b-instant"  # Fast and free on Groq
-    EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-small-en-v1.5")
+    # Vectors are cut to their first EMBEDDING_DIM components and re-normalised (0 keeps the full width).
+    # Only set this for Matryoshka-trained models; bge-small loses recall when truncated
+    EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "0"))
+    # "torch" (sentence-transformers) or "onnx-int8" (needs optimum[onnxruntime])
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
 
     # File settings
     MAX_FILE_SIZE = 10 * 1024 * 1024
     ALLOWED_EXTENSIONS = ['.pdf', '.txt', '.docx']
+    # Uploads up to this size are parsed in memory; larger ones go through a temp file
+    FILE_SIZE_MB_THRESHOLD = 8
+
+    # PDF report fonts (fpdf2 falls back to core latin-1 fonts if these are missing)
+    PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+    PDF_BOLD_FONT_PATH = os.getenv("PDF_BOLD_FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
+
+    # Local caches
+    CACHE_DIR = os.getenv("AIDA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "aida"))
+    ANSWER_CACHE_TTL = 3600  # seconds
+    ANSWER_CACHE_MAX_ENTRIES = 500
+    QUERY_CACHE_MAX_SIZE = 2000
+    QUERY_CACHE_TTL = 600  # seconds
+    SEMANTIC_CACHE_THRESHOLD = 0.95  # cosine similarity for near-duplicate questions
+
+    # Start structured-data extraction in the background as soon as comparison documents are indexed
+    PREFETCH_STRUCTURED_DATA = True
+
+    # Chat memory: only the last MAX_TURNS question/answer pairs are kept per session
+    MAX_TURNS = 10
 
     # Vector store settings
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 100
+    # Comparison ingestion: PDF parser threads and chunks per embedding call
+    PDF_LOAD_WORKERS = 4
+    EMBED_BATCH_SIZE = 64
+    # Stored vector encoding: "none" (float32), "fp16" or "sq8"
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "sq8")
+    # OpenMP threads per FAISS search (0 keeps FAISS's default of one per core)
+    FAISS_THREADS = int(os.getenv("FAISS_THREADS", "4"))
+    # HNSW graph (used for stores of 500+ chunks)
+    HNSW_M = 32
+    HNSW_EF_SEARCH = 64
+    # IVF-PQ compression for very large stores (10k+ chunks)
+    LARGE_SCALE_INDEX = os.getenv("LARGE_SCALE_INDEX", "false").lower() == "true"
 
 
 settings = Settings()
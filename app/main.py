@@ -7,15 +7,23 @@ warnings.filterwarnings('ignore')
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 logging.getLogger('torch').setLevel(logging.ERROR)
 
+# NumPy's OpenBLAS only sees small matmuls here; one thread per call avoids oversubscribing
+# cores that FAISS and the embedder already use. Must be set before numpy is imported.
+# MKL is left alone: PyTorch reads MKL_NUM_THREADS too and runs the encoder's matmuls in MKL.
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+
 import streamlit as st
-import tempfile
-import uuid
+import secrets
+import re
+import html
+import functools
 import sys
 import pandas as pd
 from datetime import datetime
 import plotly.graph_objects as go
 import plotly.express as px
 from fpdf import FPDF
+from fpdf.enums import XPos, YPos
 
 # Add project root to sys.path
 current_file = os.path.abspath(__file__)
@@ -24,6 +32,32 @@ project_root = os.path.dirname(app_dir)
 sys.path.insert(0, project_root)
 
 from app.models.rag_model import RAGModel
+from app.utils.embeddings import get_embeddings
+from app.config.settings import settings
+
+
+@st.cache_resource(show_spinner="Loading models...")
+def get_embedding_model():
+    """Load the embedding model once per process; it holds no per-user state"""
+    return get_embeddings(settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND, settings.CACHE_DIR,
+                          settings.EMBEDDING_DIM or None)
+
+
+@st.cache_resource
+def get_answer_cache():
+    """One disk answer cache per process, so all sessions share its write lock"""
+    return RAGModel.new_answer_cache()
+
+
+def get_rag_model() -> RAGModel:
+    """Return this browser session's RAG model.
+
+    Documents, vector stores and chat histories are per user, so each session
+    gets its own model; only the embedding model, answer cache and Groq clients are shared.
+    """
+    if 'rag_model' not in st.session_state:
+        st.session_state.rag_model = RAGModel(embedding=get_embedding_model(), answer_cache=get_answer_cache())
+    return st.session_state.rag_model
 
 # Page configuration
 st.set_page_config(
@@ -33,12 +67,10 @@ st.set_page_config(
 )
 
 # Initialize session state
-if 'rag_model' not in st.session_state:
-    st.session_state.rag_model = RAGModel()
 if 'document_processed' not in st.session_state:
     st.session_state.document_processed = False
 if 'session_id' not in st.session_state:
-    st.session_state.session_id = str(uuid.uuid4())[:8]
+    st.session_state.session_id = secrets.token_hex(4)
 if 'current_answer' not in st.session_state:
     st.session_state.current_answer = None
 if 'chat_history_display' not in st.session_state:
@@ -101,6 +133,11 @@ st.markdown("""
     color: #0f172a !important;
 }
 
+.comparison-grid {
+    display: grid;
+    gap: 1rem;
+}
+
 div[data-testid="stExpander"] * {
     color: #e5e7eb !important;
 }
@@ -108,31 +145,102 @@ div[data-testid="stExpander"] * {
 """, unsafe_allow_html=True)
 
 
+# ==================== RESPONSE HELPERS ====================
+
+_ROLE_LABEL_RE = re.compile(r'(?:System|Human|Assistant|Answer|Response):')
+
+
+@functools.lru_cache(maxsize=256)
+def clean_ai_response(text):
+    """Strip role labels and fragment lines from an LLM answer"""
+    text = _ROLE_LABEL_RE.sub("", text)
+    return ' '.join(line for line in map(str.strip, text.splitlines()) if len(line) > 5).strip()
+
+
+def html_text(text) -> str:
+    """Escape model or user text for an unsafe_allow_html block, keeping its line breaks"""
+    return html.escape(str(text)).replace('\n', '<br>')
+
+
 # ==================== VISUALIZATION HELPERS ====================
 
-def create_skills_comparison_chart(structured_data, doc_ids):
-    """Create bar chart comparing skills count"""
+_SKILLS_COLORS = ('#1e88e5', '#43a047', '#fb8c00')
+_EXP_COLORS = ('#26a69a', '#5c6bc0', '#ef5350')
+
+
+def skills_chart_data(structured_data, doc_ids):
+    """Build the hashable (document, skills count) pairs for the skills chart"""
+    docs = get_rag_model().documents
     skills_count = {}
 
     for doc_id in doc_ids:
         if doc_id in structured_data:
             data = structured_data[doc_id]
-            doc_name = st.session_state.rag_model.documents[doc_id]['filename']
+            doc_name = docs[doc_id]['filename']
             skills = data.get('skills', [])
             if isinstance(skills, list):
                 skills_count[doc_name] = len(skills)
             else:
                 skills_count[doc_name] = 0
 
+    return tuple(skills_count.items())
+
+
+def experience_chart_data(structured_data, doc_ids):
+    """Build the hashable (document, years) pairs for the experience chart"""
+    docs = get_rag_model().documents
+    experience_data = {}
+
+    for doc_id in doc_ids:
+        if doc_id in structured_data:
+            data = structured_data[doc_id]
+            doc_name = docs[doc_id]['filename']
+            exp_years = data.get('experience_years', 0)
+            try:
+                experience_data[doc_name] = int(exp_years) if exp_years else 0
+            except:
+                experience_data[doc_name] = 0
+
+    return tuple(experience_data.items())
+
+
+def document_size_data(doc_ids):
+    """Build the hashable (document, words, characters, sections) rows for the size chart"""
+    docs = get_rag_model().documents
+    rows = []
+    for doc_id in doc_ids:
+        doc = docs[doc_id]
+        stats = doc['stats']
+        rows.append((doc['filename'], stats['total_words'], stats['total_characters'], stats['total_chunks']))
+    return tuple(rows)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def create_stats_table(size_rows):
+    """Create the Quick Stats table column by column"""
+    return pd.DataFrame({
+        'Document': [row[0] for row in size_rows],
+        'Words': [row[1] for row in size_rows],
+        'Characters': [row[2] for row in size_rows],
+        'Sections': [row[3] for row in size_rows]
+    })
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def create_skills_comparison_chart(skills_count):
+    """Create bar chart comparing skills count"""
     if not skills_count:
         return None
 
+    names = [name for name, _ in skills_count]
+    counts = [count for _, count in skills_count]
+
     fig = go.Figure(data=[
         go.Bar(
-            x=list(skills_count.keys()),
-            y=list(skills_count.values()),
-            marker_color=['#1e88e5', '#43a047', '#fb8c00'][:len(skills_count)],
-            text=list(skills_count.values()),
+            x=names,
+            y=counts,
+            marker_color=list(_SKILLS_COLORS[:len(skills_count)]),
+            text=counts,
             textposition='auto',
         )
     ])
@@ -149,29 +257,21 @@ def create_skills_comparison_chart(structured_data, doc_ids):
     return fig
 
 
-def create_experience_comparison(structured_data, doc_ids):
+@st.cache_data(max_entries=32, show_spinner=False)
+def create_experience_comparison(experience_data):
     """Create bar chart comparing years of experience"""
-    experience_data = {}
-
-    for doc_id in doc_ids:
-        if doc_id in structured_data:
-            data = structured_data[doc_id]
-            doc_name = st.session_state.rag_model.documents[doc_id]['filename']
-            exp_years = data.get('experience_years', 0)
-            try:
-                experience_data[doc_name] = int(exp_years) if exp_years else 0
-            except:
-                experience_data[doc_name] = 0
-
     if not experience_data:
         return None
 
+    names = [name for name, _ in experience_data]
+    years = [y for _, y in experience_data]
+
     fig = go.Figure(data=[
         go.Bar(
-            x=list(experience_data.keys()),
-            y=list(experience_data.values()),
-            marker_color=['#26a69a', '#5c6bc0', '#ef5350'][:len(experience_data)],
-            text=[f"{y} years" for y in experience_data.values()],
+            x=names,
+            y=years,
+            marker_color=list(_EXP_COLORS[:len(experience_data)]),
+            text=[f"{y} years" for y in years],
             textposition='auto',
         )
     ])
@@ -187,35 +287,24 @@ def create_experience_comparison(structured_data, doc_ids):
     return fig
 
 
-def create_document_size_comparison(doc_ids):
+@st.cache_data(max_entries=32, show_spinner=False)
+def create_document_size_comparison(size_rows):
     """Create comparison of document sizes"""
-    size_data = {
-        'Document': [],
-        'Words': [],
-        'Characters': [],
-        'Sections': []
-    }
-
-    for doc_id in doc_ids:
-        doc_info = st.session_state.rag_model.documents[doc_id]
-        size_data['Document'].append(doc_info['filename'])
-        size_data['Words'].append(doc_info['stats']['total_words'])
-        size_data['Characters'].append(doc_info['stats']['total_characters'])
-        size_data['Sections'].append(doc_info['stats']['total_chunks'])
+    documents = [row[0] for row in size_rows]
 
     fig = go.Figure()
 
     fig.add_trace(go.Bar(
         name='Words',
-        x=size_data['Document'],
-        y=size_data['Words'],
+        x=documents,
+        y=[row[1] for row in size_rows],
         marker_color='#42a5f5'
     ))
 
     fig.add_trace(go.Bar(
         name='Sections',
-        x=size_data['Document'],
-        y=size_data['Sections'],
+        x=documents,
+        y=[row[3] for row in size_rows],
         marker_color='#66bb6a',
         yaxis='y2'
     ))
@@ -242,116 +331,251 @@ def create_document_size_comparison(doc_ids):
 def generate_comparison_pdf(doc_ids, comparison_results, recommendation=None):
     """Generate PDF report of comparison"""
 
+    docs = get_rag_model().documents
+    doc_meta = [(docs[doc_id]['filename'], docs[doc_id]['stats']) for doc_id in doc_ids]
+
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
 
+    # Prefer a Unicode TTF font; core fonts only cover latin-1
+    font_family = 'Helvetica'
+    if os.path.exists(settings.PDF_FONT_PATH):
+        bold_path = settings.PDF_BOLD_FONT_PATH
+        pdf.add_font('DejaVu', '', settings.PDF_FONT_PATH)
+        pdf.add_font('DejaVu', 'B', bold_path if os.path.exists(bold_path) else settings.PDF_FONT_PATH)
+        font_family = 'DejaVu'
+
+    def text(value):
+        if font_family == 'DejaVu':
+            return value
+        return value.encode('latin-1', errors='replace').decode('latin-1')
+
+    # Only touch FPDF's font state when it actually changes
+    last_font = None
+
+    def set_font(style, size):
+        nonlocal last_font
+        if (style, size) != last_font:
+            pdf.set_font(font_family, style, size)
+            last_font = (style, size)
+
     # Title
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, 'Document Comparison Report', ln=True, align='C')
+    set_font('B', 16)
+    pdf.cell(0, 10, 'Document Comparison Report', new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
 
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(0, 10, f'Generated: {datetime.now().strftime("%Y-%m-%d %H:%M")}', ln=True, align='C')
+    set_font('', 10)
+    pdf.cell(0, 10, f'Generated: {datetime.now().strftime("%Y-%m-%d %H:%M")}', new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
     pdf.ln(10)
 
     # Documents compared
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, 'Documents Compared:', ln=True)
-    pdf.set_font('Arial', '', 10)
+    set_font('B', 12)
+    pdf.cell(0, 10, 'Documents Compared:', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    set_font('', 10)
 
-    for doc_id in doc_ids:
-        doc_name = st.session_state.rag_model.documents[doc_id]['filename']
-        # Truncate long filenames
-        if len(doc_name) > 50:
-            doc_name = doc_name[:47] + '...'
-        pdf.cell(0, 8, f'  - {doc_name}', ln=True)
+    # Truncate long filenames
+    names = [name if len(name) <= 50 else name[:47] + '...' for name, _ in doc_meta]
+    pdf.multi_cell(0, 8, text('\n'.join(f'  - {name}' for name in names)), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
     pdf.ln(5)
 
     # Statistics
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, 'Document Statistics:', ln=True)
-    pdf.set_font('Arial', '', 9)
+    set_font('B', 12)
+    pdf.cell(0, 10, 'Document Statistics:', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    set_font('', 9)
 
-    for doc_id in doc_ids:
-        doc_info = st.session_state.rag_model.documents[doc_id]
-        doc_name = doc_info['filename']
+    stat_blocks = []
+    for doc_name, stats in doc_meta:
         if len(doc_name) > 40:
             doc_name = doc_name[:37] + '...'
-
-        pdf.cell(0, 6, f"{doc_name}:", ln=True)
-        pdf.cell(0, 5, f"  Words: {doc_info['stats']['total_words']:,}", ln=True)
-        pdf.cell(0, 5, f"  Sections: {doc_info['stats']['total_chunks']}", ln=True)
-        pdf.ln(2)
+        stat_blocks.append(
+            f"{doc_name}:\n"
+            f"  Words: {stats['total_words']:,}\n"
+            f"  Sections: {stats['total_chunks']}\n"
+        )
+    pdf.multi_cell(0, 5, text('\n'.join(stat_blocks)), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
     pdf.ln(5)
 
     # Comparison results
     if comparison_results:
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(0, 10, 'Detailed Comparison:', ln=True)
+        set_font('B', 12)
+        pdf.cell(0, 10, 'Detailed Comparison:', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
         for aspect, candidates in comparison_results.items():
-            # Check if we need a new page
-            if pdf.get_y() > 250:
-                pdf.add_page()
-
-            pdf.set_font('Arial', 'B', 11)
+            set_font('B', 11)
             aspect_text = aspect.title()
             if len(aspect_text) > 60:
                 aspect_text = aspect_text[:57] + '...'
-            pdf.multi_cell(0, 8, f'\n{aspect_text}:')
+            pdf.multi_cell(0, 8, text(f'\n{aspect_text}:'), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
 
-            pdf.set_font('Arial', '', 8)  # Smaller font for content
+            set_font('', 8)  # Smaller font for content
 
-            for doc_id in doc_ids:
-                doc_name = st.session_state.rag_model.documents[doc_id]['filename']
+            entries = []
+            for doc_id, (doc_name, _) in zip(doc_ids, doc_meta):
                 if len(doc_name) > 30:
                     doc_name = doc_name[:27] + '...'
 
                 content = candidates.get(doc_id, 'N/A')
 
                 # Clean and truncate content
-                content = content.replace('\n', ' ').replace('\r', ' ')
-                content = ' '.join(content.split())  # Remove extra spaces
+                content = ' '.join(content.split())  # Collapse newlines and extra spaces
 
                 # Limit content length
                 if len(content) > 250:
                     content = content[:247] + '...'
 
-                # Safe multi-cell with error handling
-                try:
-                    pdf.set_left_margin(15)
-                    pdf.multi_cell(0, 5, f'{doc_name}: {content}', align='L')
-                    pdf.set_left_margin(10)
-                except Exception as e:
-                    # Fallback: use cell instead
-                    pdf.cell(0, 5, f'{doc_name}: [Content too long]', ln=True)
+                entries.append(f'{doc_name}: {content}')
 
-                pdf.ln(2)
+            # One indented block per aspect, with error handling
+            pdf.set_left_margin(15)
+            try:
+                pdf.multi_cell(0, 5, text('\n\n'.join(entries)), align='L',
+                               new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            except Exception as e:
+                # Fallback: use cell instead
+                pdf.cell(0, 5, '[Content too long]', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            pdf.set_left_margin(10)
+
+            pdf.ln(2)
 
     # Recommendation
     if recommendation:
         pdf.add_page()
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'AI Recommendation:', ln=True)
-        pdf.set_font('Arial', '', 9)
+        set_font('B', 14)
+        pdf.cell(0, 10, 'AI Recommendation:', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        set_font('', 9)
 
         # Clean recommendation text
         rec_text = recommendation.replace('\n\n', '\n').replace('\r', '')
         rec_text = rec_text[:1500]  # Limit length
 
         try:
-            pdf.multi_cell(0, 5, rec_text)
+            pdf.multi_cell(0, 5, text(rec_text), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
         except Exception as e:
             # Fallback for very long text
-            pdf.cell(0, 5, 'Recommendation available in the app', ln=True)
+            pdf.cell(0, 5, 'Recommendation available in the app', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    return bytes(pdf.output())
+
+
+# ==================== FRAGMENTS ====================
+# Fragments rerun on their own, so interacting with them does not rebuild the rest of the page
+
+@st.fragment
+def chat_management_sidebar():
+    """Sidebar chat session management for single document mode"""
+    rag_model = get_rag_model()
+
+    st.header("💬 Chat Management")
+    st.write(f"**Current Session:** {st.session_state.session_id}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🆕 New Session"):
+            st.session_state.session_id = secrets.token_hex(4)
+            st.session_state.current_answer = None
+            st.success(f"New session: {st.session_state.session_id}")
+            st.rerun()
+
+    with col2:
+        if st.button("🗑️ Clear Current"):
+            rag_model.clear_chat_history(st.session_state.session_id)
+            st.session_state.current_answer = None
+            st.success("Chat cleared!")
+            st.rerun()
+
+    st.subheader("📚 Chat Sessions")
+    histories = rag_model.get_all_chat_histories()
+    active_sessions = list(histories)
+
+    if active_sessions:
+        session_options = ["Select a session..."]
+        session_mapping = {}
+
+        for session in active_sessions:
+            chat_count = len(histories[session]) // 2
+
+            if session == st.session_state.session_id:
+                display_name = f"🟢 Session {session} ({chat_count} Q&As) - Current"
+            else:
+                display_name = f"⚪ Session {session} ({chat_count} Q&As)"
+
+            session_options.append(display_name)
+            session_mapping[display_name] = session
+
+        selected_display = st.selectbox(
+            "Choose Chat History:",
+            options=session_options,
+            index=0
+        )
 
-    try:
-        return pdf.output(dest='S').encode('latin1')
-    except:
-        # If encoding fails, try UTF-8
-        return pdf.output(dest='S').encode('utf-8', errors='ignore')
+        if selected_display != "Select a session..." and selected_display in session_mapping:
+            selected_session_id = session_mapping[selected_display]
+
+            col_action1, col_action2 = st.columns(2)
+            with col_action1:
+                if st.button("🔄 Follow Up", key=f"followup_{selected_session_id}"):
+                    st.session_state.session_id = selected_session_id
+                    session_history = histories[selected_session_id]
+                    if session_history:
+                        st.session_state.chat_history_display = session_history
+                        st.success(f"✅ Loaded Session: {selected_session_id}")
+                    st.rerun()
+
+            with col_action2:
+                if st.button("🗑️ Clear", key=f"clear_{selected_session_id}"):
+                    rag_model.clear_chat_history(selected_session_id)
+                    if selected_session_id == st.session_state.session_id:
+                        st.session_state.current_answer = None
+                    st.success(f"🗑️ Cleared: {selected_session_id}")
+                    st.rerun()
+
+    st.subheader("📊 Statistics")
+    total_sessions = len(active_sessions) if active_sessions else 0
+    current_chat_count = len(histories.get(st.session_state.session_id, [])) // 2
+    st.metric("Total Sessions", total_sessions)
+    st.metric("Current Q&As", current_chat_count)
+
+
+@st.fragment
+def visual_analytics(doc_ids):
+    """Visual Analytics view for comparison mode"""
+    rag_model = get_rag_model()
+    docs = rag_model.documents
+
+    st.subheader("📈 Visual Analytics")
+
+    if st.button("Generate Visual Analysis", type="primary", key="generate_visuals"):
+        with st.spinner("Extracting and visualizing data..."):
+            st.session_state.structured_data = rag_model.extract_structured_data_batch(doc_ids)
+
+    if st.session_state.structured_data:
+        structured_data = st.session_state.structured_data
+
+        # Skills comparison chart
+        st.markdown("### 📊 Skills Count Comparison")
+        fig_skills = create_skills_comparison_chart(skills_chart_data(structured_data, doc_ids))
+        if fig_skills:
+            st.plotly_chart(fig_skills, use_container_width=True)
+        else:
+            st.info("No skills data available for visualization")
+
+        # Experience comparison
+        st.markdown("### 💼 Experience Comparison")
+        fig_exp = create_experience_comparison(experience_chart_data(structured_data, doc_ids))
+        if fig_exp:
+            st.plotly_chart(fig_exp, use_container_width=True)
+        else:
+            st.info("No experience data available for visualization")
+
+        # Structured data display
+        st.markdown("### 📄 Detailed Data")
+        for doc_id in doc_ids:
+            data = structured_data[doc_id]
+            doc_name = docs[doc_id]['filename']
+            with st.expander(f"📄 {doc_name}", expanded=False):
+                st.json(data)
 
 
 # ==================== NAVIGATION ====================
@@ -365,6 +589,7 @@ mode = st.sidebar.radio(
 # ==================== SINGLE DOCUMENT MODE ====================
 if mode == "📄 Single Document Q&A":
     st.session_state.comparison_mode = False
+    rag_model = get_rag_model()
 
     st.title("🤖 AI Document Assistant")
     st.markdown("Upload a PDF document and ask questions about its content!")
@@ -381,91 +606,17 @@ if mode == "📄 Single Document Q&A":
         if uploaded_file is not None:
             if st.button("Process Document", type="primary"):
                 with st.spinner("Processing document..."):
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                        tmp_file.write(uploaded_file.getvalue())
-                        tmp_file_path = tmp_file.name
-
-                    result = st.session_state.rag_model.process_document(tmp_file_path)
-                    os.unlink(tmp_file_path)
+                    result = rag_model.process_document_bytes(uploaded_file, uploaded_file.name)
                     st.success(result)
                     st.session_state.document_processed = True
 
         if st.session_state.document_processed:
-            st.header("💬 Chat Management")
-            st.write(f"**Current Session:** {st.session_state.session_id}")
-
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("🆕 New Session"):
-                    st.session_state.session_id = str(uuid.uuid4())[:8]
-                    st.session_state.current_answer = None
-                    st.success(f"New session: {st.session_state.session_id}")
-                    st.rerun()
-
-            with col2:
-                if st.button("🗑️ Clear Current"):
-                    st.session_state.rag_model.clear_chat_history(st.session_state.session_id)
-                    st.session_state.current_answer = None
-                    st.success("Chat cleared!")
-                    st.rerun()
-
-            st.subheader("📚 Chat Sessions")
-            active_sessions = st.session_state.rag_model.list_active_sessions()
-
-            if active_sessions:
-                session_options = ["Select a session..."]
-                session_mapping = {}
-
-                for session in active_sessions:
-                    session_history = st.session_state.rag_model.get_chat_history(session)
-                    chat_count = len(session_history) // 2 if session_history else 0
-
-                    if session == st.session_state.session_id:
-                        display_name = f"🟢 Session {session} ({chat_count} Q&As) - Current"
-                    else:
-                        display_name = f"⚪ Session {session} ({chat_count} Q&As)"
-
-                    session_options.append(display_name)
-                    session_mapping[display_name] = session
-
-                selected_display = st.selectbox(
-                    "Choose Chat History:",
-                    options=session_options,
-                    index=0
-                )
-
-                if selected_display != "Select a session..." and selected_display in session_mapping:
-                    selected_session_id = session_mapping[selected_display]
-
-                    col_action1, col_action2 = st.columns(2)
-                    with col_action1:
-                        if st.button("🔄 Follow Up", key=f"followup_{selected_session_id}"):
-                            st.session_state.session_id = selected_session_id
-                            session_history = st.session_state.rag_model.get_chat_history(selected_session_id)
-                            if session_history:
-                                st.session_state.chat_history_display = session_history
-                                st.success(f"✅ Loaded Session: {selected_session_id}")
-                            st.rerun()
-
-                    with col_action2:
-                        if st.button("🗑️ Clear", key=f"clear_{selected_session_id}"):
-                            st.session_state.rag_model.clear_chat_history(selected_session_id)
-                            if selected_session_id == st.session_state.session_id:
-                                st.session_state.current_answer = None
-                            st.success(f"🗑️ Cleared: {selected_session_id}")
-                            st.rerun()
-
-            st.subheader("📊 Statistics")
-            total_sessions = len(active_sessions) if active_sessions else 0
-            current_session_history = st.session_state.rag_model.get_chat_history(st.session_state.session_id)
-            current_chat_count = len(current_session_history) // 2 if current_session_history else 0
-            st.metric("Total Sessions", total_sessions)
-            st.metric("Current Q&As", current_chat_count)
+            chat_management_sidebar()
 
     if st.session_state.document_processed:
         st.header("💬 Ask Questions")
 
-        current_session_history = st.session_state.rag_model.get_chat_history(st.session_state.session_id)
+        current_session_history = rag_model.get_chat_history(st.session_state.session_id)
         current_chat_count = len(current_session_history) // 2 if current_session_history else 0
         st.info(f"**Session:** {st.session_state.session_id} | **Questions:** {current_chat_count}")
 
@@ -479,40 +630,38 @@ if mode == "📄 Single Document Q&A":
 
         if ask_button and question.strip():
             st.session_state.current_answer = None
-            with st.spinner("Generating answer..."):
-                response = st.session_state.rag_model.ask_question(question, st.session_state.session_id)
-
+            with st.spinner("Searching document..."):
+                response = rag_model.ask_question_stream(question, st.session_state.session_id)
 
-                def clean_ai_response(text):
-                    text = text.replace("System:", "").replace("Human:", "").replace("Assistant:", "")
-                    text = text.replace("Answer:", "").replace("Response:", "")
-                    lines = [l.strip() for l in text.split('\n') if l.strip() and len(l.strip()) > 5]
-                    return ' '.join(lines).strip()
+            # Show tokens as they arrive, then swap in the formatted answer card below
+            stream_box = st.empty()
+            with stream_box.container():
+                streamed_answer = st.write_stream(response["answer_stream"])
+            stream_box.empty()
 
+            clean_answer = clean_ai_response(streamed_answer)
+            if not clean_answer or len(clean_answer) < 5:
+                clean_answer = "I cannot provide a clear answer."
 
-                clean_answer = clean_ai_response(response["answer"])
-                if not clean_answer or len(clean_answer) < 5:
-                    clean_answer = "I cannot provide a clear answer."
-
-                st.session_state.current_answer = {
-                    "question": question,
-                    "answer": clean_answer,
-                    "sources": response.get("sources", [])
-                }
+            st.session_state.current_answer = {
+                "question": question,
+                "answer": clean_answer,
+                "sources": response.get("sources", [])
+            }
 
         if st.session_state.current_answer:
             st.markdown("---")
             st.markdown(f"""
             <div class="question-display">
                 <h4>❓ Your Question:</h4>
-                <p>{st.session_state.current_answer['question']}</p>
+                <p>{html_text(st.session_state.current_answer['question'])}</p>
             </div>
             """, unsafe_allow_html=True)
 
             st.markdown(f"""
             <div class="main-answer">
                 <h4>🤖 Answer:</h4>
-                <p>{st.session_state.current_answer['answer']}</p>
+                <p>{html_text(st.session_state.current_answer['answer'])}</p>
             </div>
             """, unsafe_allow_html=True)
 
@@ -525,23 +674,21 @@ if mode == "📄 Single Document Q&A":
         if st.session_state.get('chat_history_display'):
             st.markdown("---")
             st.subheader("📜 Complete Chat History")
+            # One markdown call for the whole history instead of one per message
+            html_parts = []
             for i, message in enumerate(st.session_state.chat_history_display):
+                turn = (i // 2) + 1
                 if message["role"] == "user":
-                    q_num = (i // 2) + 1
-                    st.markdown(f"""
-                    <div class="question-display">
-                        <h4>❓ Question {q_num}:</h4>
-                        <p>{message["content"]}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+                    html_parts.append(
+                        f'<div class="question-display"><h4>❓ Question {turn}:</h4>'
+                        f'<p>{html_text(message["content"])}</p></div>'
+                    )
                 elif message["role"] == "assistant":
-                    a_num = (i // 2) + 1
-                    st.markdown(f"""
-                    <div class="main-answer">
-                        <h4>🤖 Answer {a_num}:</h4>
-                        <p>{message["content"]}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+                    html_parts.append(
+                        f'<div class="main-answer"><h4>🤖 Answer {turn}:</h4>'
+                        f'<p>{html_text(message["content"])}</p></div>'
+                    )
+            st.markdown('\n'.join(html_parts), unsafe_allow_html=True)
 
             if st.button("🔄 Hide History", type="secondary"):
                 del st.session_state.chat_history_display
@@ -561,6 +708,7 @@ if mode == "📄 Single Document Q&A":
 # ==================== COMPARISON MODE ====================
 elif mode == "⚖️ Document Comparison":
     st.session_state.comparison_mode = True
+    rag_model = get_rag_model()
 
     # Add reset button
     if st.session_state.comparison_files:
@@ -608,52 +756,40 @@ elif mode == "⚖️ Document Comparison":
                         # Store current file names
                         st.session_state.last_uploaded_files = current_files
 
-                        status_text = st.empty()
-
-                        try:
-                            status_text.info("📄 Extracting text from PDFs...")
-
-                            temp_paths = []
-                            filename_mapping = {}  # Map temp path to original filename
-
-                            for uploaded_file in uploaded_files:
-                                # Create temp file with original filename preserved
-                                temp_dir = tempfile.gettempdir()
-                                # Use original filename in temp directory
-                                temp_path = os.path.join(temp_dir, uploaded_file.name)
+                        with st.status("📄 Extracting text from PDFs...", expanded=True) as status:
+                            try:
+                                # UploadedFile is already a BytesIO, so hand it over without copying
+                                files = [(f.name, f) for f in uploaded_files]
 
-                                # Write file
-                                with open(temp_path, 'wb') as f:
-                                    f.write(uploaded_file.getvalue())
+                                status.update(label="🔄 Creating embeddings (30-60 seconds)...")
 
-                                temp_paths.append(temp_path)
-                                filename_mapping[temp_path] = uploaded_file.name
+                                def show_progress(done, total, filename):
+                                    status.write(f"📄 Finished {filename}")
+                                    status.update(label=f"🔄 Processed {done}/{total} documents...")
 
-                            status_text.info("🔄 Creating embeddings (30-60 seconds)...")
-                            results = st.session_state.rag_model.process_multiple_documents(temp_paths)
+                                results = rag_model.process_multiple_documents_bytes(
+                                    files,
+                                    progress_callback=show_progress
+                                )
 
-                            # Clean up temp files
-                            for path in temp_paths:
-                                try:
-                                    os.unlink(path)
-                                except:
-                                    pass
+                                for doc_id, result in results.items():
+                                    if result['status'] == 'error':
+                                        status.write(f"❌ {doc_id}: {result['error']}")
 
-                            # Store results
-                            st.session_state.comparison_files = list(results.keys())
-                            st.session_state.processing_complete = True
+                                # Store results; failed documents have no entry to compare
+                                st.session_state.comparison_files = [
+                                    doc_id for doc_id, result in results.items() if result['status'] == 'success'
+                                ]
+                                st.session_state.processing_complete = True
 
-                            # Clear status and show success
-                            status_text.empty()
-                            st.success(f"✅ Processed {len(results)} documents successfully!")
+                                status.update(
+                                    label=f"✅ Processed {len(st.session_state.comparison_files)} documents successfully!",
+                                    state="complete",
+                                    expanded=False
+                                )
 
-                        except Exception as e:
-                            status_text.error(f"❌ Error: {str(e)}")
-                            for path in temp_paths:
-                                try:
-                                    os.unlink(path)
-                                except:
-                                    pass
+                            except Exception as e:
+                                status.update(label=f"❌ Error: {str(e)}", state="error")
 
             # Show status if already processed
             elif already_processed and not files_changed:
@@ -669,58 +805,71 @@ elif mode == "⚖️ Document Comparison":
 
     if st.session_state.comparison_files:
         doc_ids = st.session_state.comparison_files
+        docs = rag_model.documents
 
-        tab1, tab2, tab3, tab4 = st.tabs([
+        comparison_tabs = [
             "📊 Quick Stats",
             "🔍 Detailed Comparison",
             "💡 Recommendation",
             "📈 Visual Analytics"
-        ])
+        ]
+
+        # st.tabs executes every tab body on each rerun; a radio selector lets
+        # only the visible view build and ship its charts
+        active_tab = st.radio(
+            "View",
+            comparison_tabs,
+            horizontal=True,
+            key="active_tab",
+            label_visibility="collapsed"
+        )
 
-        with tab1:
+        if active_tab == "📊 Quick Stats":
             st.subheader("📊 Document Statistics")
 
-            stats_data = []
-            for doc_id in doc_ids:
-                doc_info = st.session_state.rag_model.documents[doc_id]
-                stats_data.append({
-                    'Document': doc_info['filename'],
-                    'Words': f"{doc_info['stats']['total_words']:,}",
-                    'Characters': f"{doc_info['stats']['total_characters']:,}",
-                    'Sections': doc_info['stats']['total_chunks']
-                })
-
-            df_stats = pd.DataFrame(stats_data)
-            st.dataframe(df_stats, use_container_width=True)
+            size_rows = document_size_data(doc_ids)
+            df_stats = create_stats_table(size_rows)
+            # Keep counts numeric so Arrow sends int64 and the table stays sortable
+            st.dataframe(
+                df_stats,
+                use_container_width=True,
+                column_config={
+                    'Words': st.column_config.NumberColumn(format='%d'),
+                    'Characters': st.column_config.NumberColumn(format='%d'),
+                }
+            )
 
             st.markdown("### 📈 Visual Comparison")
-            fig_size = create_document_size_comparison(doc_ids)
+            fig_size = create_document_size_comparison(size_rows)
             st.plotly_chart(fig_size, use_container_width=True)
 
-        with tab2:
+        elif active_tab == "🔍 Detailed Comparison":
             st.subheader("🔍 Detailed Side-by-Side Comparison")
 
             if st.button("🔄 Run Comparison Analysis", type="primary"):
                 with st.spinner("Analyzing documents..."):
-                    comparison_results = st.session_state.rag_model.compare_documents(doc_ids)
+                    comparison_results = rag_model.compare_documents(doc_ids)
                     st.session_state.comparison_results = comparison_results
 
             if st.session_state.comparison_results:
                 results = st.session_state.comparison_results
 
+                # Pre-build every aspect's side-by-side grid and send it as one element
+                grid_style = f"grid-template-columns: repeat({len(doc_ids)}, 1fr);"
+                html_parts = []
                 for aspect, candidates in results.items():
-                    st.markdown(f"### {aspect.title()}")
-
-                    cols = st.columns(len(doc_ids))
-                    for idx, doc_id in enumerate(doc_ids):
-                        with cols[idx]:
-                            doc_name = st.session_state.rag_model.documents[doc_id]['filename']
-                            st.markdown(f"**{doc_name}**")
-                            st.info(candidates.get(doc_id, "N/A"))
-
-                    st.markdown("---")
-
-        with tab3:
+                    cells = ''.join(
+                        f'<div class="comparison-card"><h4>{html.escape(docs[doc_id]["filename"])}</h4>'
+                        f'<p>{html_text(candidates.get(doc_id, "N/A"))}</p></div>'
+                        for doc_id in doc_ids
+                    )
+                    html_parts.append(
+                        f'<h3>{html.escape(aspect.title())}</h3>'
+                        f'<div class="comparison-grid" style="{grid_style}">{cells}</div><hr>'
+                    )
+                st.markdown('\n'.join(html_parts), unsafe_allow_html=True)
+
+        elif active_tab == "💡 Recommendation":
             st.subheader("💡 AI Recommendation")
 
             job_role = st.text_input(
@@ -731,11 +880,20 @@ elif mode == "⚖️ Document Comparison":
             recommendation_text = None
 
             if st.button("Get Recommendation", type="primary"):
-                with st.spinner("Generating recommendation..."):
-                    recommendation_text = st.session_state.rag_model.get_recommendation(doc_ids, job_role)
-                    st.session_state.recommendation = recommendation_text
-                    st.markdown("### 🎯 Recommendation")
-                    st.success(recommendation_text)
+                # Reuse the Detailed Comparison results rather than re-running every aspect
+                if not st.session_state.comparison_results:
+                    with st.spinner("Comparing documents..."):
+                        st.session_state.comparison_results = rag_model.compare_documents(doc_ids)
+
+                st.markdown("### 🎯 Recommendation")
+                placeholder = st.empty()
+                with placeholder.container():
+                    streamed = st.write_stream(rag_model.get_recommendation(
+                        doc_ids, job_role, comparison_data=st.session_state.comparison_results
+                    ))
+                recommendation_text = streamed.strip()
+                st.session_state.recommendation = recommendation_text
+                placeholder.success(recommendation_text)
 
             # Display previously generated recommendation
             if 'recommendation' in st.session_state and st.session_state.recommendation:
@@ -769,43 +927,8 @@ elif mode == "⚖️ Document Comparison":
                             )
                             st.success("✅ PDF ready for download!")
 
-        with tab4:
-            st.subheader("📈 Visual Analytics")
-
-            if st.button("Generate Visual Analysis", type="primary", key="generate_visuals"):
-                with st.spinner("Extracting and visualizing data..."):
-                    structured_data = {}
-                    for doc_id in doc_ids:
-                        structured_data[doc_id] = st.session_state.rag_model.extract_structured_data(doc_id)
-
-                    st.session_state.structured_data = structured_data
-
-            if st.session_state.structured_data:
-                structured_data = st.session_state.structured_data
-
-                # Skills comparison chart
-                st.markdown("### 📊 Skills Count Comparison")
-                fig_skills = create_skills_comparison_chart(structured_data, doc_ids)
-                if fig_skills:
-                    st.plotly_chart(fig_skills, use_container_width=True)
-                else:
-                    st.info("No skills data available for visualization")
-
-                # Experience comparison
-                st.markdown("### 💼 Experience Comparison")
-                fig_exp = create_experience_comparison(structured_data, doc_ids)
-                if fig_exp:
-                    st.plotly_chart(fig_exp, use_container_width=True)
-                else:
-                    st.info("No experience data available for visualization")
-
-                # Structured data display
-                st.markdown("### 📄 Detailed Data")
-                for doc_id in doc_ids:
-                    data = structured_data[doc_id]
-                    doc_name = st.session_state.rag_model.documents[doc_id]['filename']
-                    with st.expander(f"📄 {doc_name}", expanded=False):
-                        st.json(data)
+        elif active_tab == "📈 Visual Analytics":
+            visual_analytics(doc_ids)
 
     else:
         st.info("👆 Upload 2-3 documents in the sidebar to start comparing")
@@ -19,7 +19,8 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
+from app.config.settings import settings
 
 
 class ChatRAGModel(RAGModel):
@@ -27,7 +28,7 @@ class ChatRAGModel(RAGModel):
         super().__init__()
 
         # Enhanced memory management
-        self.conversation_memories: Dict[str, ConversationBufferMemory] = {}
+        self.conversation_memories: Dict[str, ConversationBufferWindowMemory] = {}
 
         # Enhanced prompts for better conversation flow
         self.enhanced_contextualize_prompt = ChatPromptTemplate.from_messages([
@@ -61,16 +62,22 @@ class ChatRAGModel(RAGModel):
             ("human", "{input}"),
         ])
 
-    def get_conversation_memory(self, session_id: str) -> ConversationBufferMemory:
-        """Get or create conversation buffer memory for a session."""
+    def get_conversation_memory(self, session_id: str) -> ConversationBufferWindowMemory:
+        """Get or create a sliding-window conversation memory for a session."""
         if session_id not in self.conversation_memories:
-            self.conversation_memories[session_id] = ConversationBufferMemory(
+            self.conversation_memories[session_id] = ConversationBufferWindowMemory(
+                k=settings.MAX_TURNS,
                 memory_key="chat_history",
                 return_messages=True,
                 output_key="answer"  # Important for retrieval chains
             )
         return self.conversation_memories[session_id]
 
+    @staticmethod
+    def _trim_memory(memory: ConversationBufferWindowMemory):
+        """Drop messages older than the window; k only limits what is loaded, not what is stored."""
+        del memory.chat_memory.messages[:-memory.k * 2]
+
     def create_enhanced_chat_chain(self):
         """Create enhanced conversational retrieval chain with better memory."""
         if self.vector_store_manager.vector_store:
@@ -104,6 +111,8 @@ class ChatRAGModel(RAGModel):
             # Process document using parent class
             chunks = self.document_processor.load_pdf(file_path)
             self.vector_store_manager.create_vector_store(chunks)
+            # Answers cached for the previous document no longer apply
+            self.query_cache.clear()
 
             # Create enhanced chat chain
             if self.create_enhanced_chat_chain():
@@ -131,6 +140,25 @@ class ChatRAGModel(RAGModel):
             # Get chat history from both our custom storage and memory buffer
             custom_history = self.get_session_history(session_id).messages
 
+            # Follow-up answers depend on the conversation, so only opening questions use the cache
+            q_emb = None
+            if not custom_history:
+                cached, q_emb = self.query_cache.lookup(question, self.vector_store_manager.embed_query)
+                if cached:
+                    history = self.get_session_history(session_id)
+                    history.add_user_message(question)
+                    history.add_ai_message(cached["answer"])
+                    memory.chat_memory.add_user_message(question)
+                    memory.chat_memory.add_ai_message(cached["answer"])
+                    self._trim_memory(memory)
+                    return {
+                        "answer": cached["answer"],
+                        "sources": cached["sources"],
+                        "session_id": session_id,
+                        "memory_used": True,
+                        "conversation_length": 0
+                    }
+
             # Invoke the retrieval chain with chat history
             result = self.retrieval_chain.invoke({
                 "input": question,
@@ -145,13 +173,18 @@ class ChatRAGModel(RAGModel):
             # Also update the conversation buffer memory
             memory.chat_memory.add_user_message(question)
             memory.chat_memory.add_ai_message(result["answer"])
+            self._trim_memory(memory)
 
             # Get sources from similarity search
             relevant_docs = self.vector_store_manager.similarity_search(question, k=4)
+            sources = [doc.page_content[:200] + "..." for doc in relevant_docs]
+
+            if q_emb is not None:
+                self.query_cache.set(question, q_emb, result["answer"], sources)
 
             return {
                 "answer": result["answer"],
-                "sources": [doc.page_content[:200] + "..." for doc in relevant_docs],
+                "sources": sources,
                 "session_id": session_id,
                 "memory_used": True,
                 "conversation_length": len(custom_history) // 2
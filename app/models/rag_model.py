@@ -1,139 +1,431 @@
 import sys
 import os
-from typing import Dict, Any, List
-from groq import Groq
+from typing import Dict, Any, List, Optional, Callable, Tuple, Iterator, Union, BinaryIO, Deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+import asyncio
 import json
-from collections import defaultdict
+import hashlib
+import numpy as np
+from collections import defaultdict, deque
+from queue import SimpleQueue
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.utils.vector_store import VectorStoreManager
-from app.utils.document_processor import DocumentProcessor
+from app.utils.vector_store import VectorStoreManager, set_search_threads
+from app.utils.embeddings import get_embeddings
+from app.utils.document_processor import DocumentProcessor, has_text
+from app.utils.answer_cache import AnswerCache
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.query_cache import QueryCache
+from app.utils.async_utils import run_sync, submit
+from app.utils.llm_clients import get_groq_client, get_async_groq_client
 from app.config.settings import settings
 
+# Prompts are built once at import; each call only fills in the placeholders
+COMPARE_TEMPLATE = """Analyze this document section and extract information about each aspect below.
+Be specific and concise. List key points as bullet points.
+
+Return a JSON object with exactly these keys, each mapped to a bullet-point string:
+{key_list}
+
+Document section:
+{context}"""
+
+COMPARE_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a document analyzer. Extract specific information concisely in bullet points. "
+               "Return only valid JSON."
+}
+
+RECOMMENDATION_TEMPLATE = """Based on the document comparison below, provide a comprehensive recommendation{role_context}.
+
+{context}
+
+Provide your analysis in this format:
+
+## Overall Recommendation
+[Which document/candidate is the strongest and why - be specific]
+
+## Individual Strengths
+[List key strengths of each candidate]
+
+## Best Fit Analysis
+[Explain which candidate is best suited and why]
+
+## Key Differentiators
+[What sets the top candidate apart]
+
+Be specific, actionable, and professional."""
+
+RECOMMENDATION_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are an expert analyst providing detailed, actionable recommendations."
+}
+
+STRUCTURED_DATA_TEMPLATE = """Extract structured information from this document.
+    Provide a JSON response with these fields (use "N/A" if not found):
+    {{
+      "name": "Full name",
+      "email": "Email address",
+      "phone": "Phone number",
+      "skills": ["skill1", "skill2", "skill3"],
+      "experience_years": 0,
+      "education": ["degree1", "degree2"],
+      "certifications": ["cert1", "cert2"],
+      "key_achievements": ["achievement1", "achievement2", "achievement3"]
+    }}
+
+    Document text:
+    {text}
+
+    Respond with ONLY valid JSON, no other text."""
+
+STRUCTURED_DATA_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a data extraction specialist. Return only valid JSON."
+}
+
+QA_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": """You are a document assistant. Answer using ONLY the provided context.
+
+Rules:
+- Extract facts, names, dates, numbers from context
+- If asked for summary, cover main points
+- If asked for details, be specific
+- If not in context, say: "I cannot find that information"
+- Do not add information not in context"""
+}
+
+QA_TEMPLATE = "Context:\n{context}\n\nQuestion: {question}\n\nAnswer:"
+
 
 class RAGModel:
-    def __init__(self):
+    def __init__(self, embedding: Optional[Embeddings] = None, answer_cache: Optional[AnswerCache] = None):
         self.document_processor = DocumentProcessor(
             chunk_size=settings.CHUNK_SIZE,
-            chunk_overlap=settings.CHUNK_OVERLAP
+            chunk_overlap=settings.CHUNK_OVERLAP,
+            spill_threshold_mb=settings.FILE_SIZE_MB_THRESHOLD
         )
 
         # NEW: Store multiple documents for comparison
-        self.documents = {}  # {doc_id: {filename, stats, vector_store, chunks, total_text}}
-
-        self.vector_store_manager = VectorStoreManager(
-            embedding_model=settings.EMBEDDING_MODEL
+        self.documents = {}  # {doc_id: {filename, stats, vector_store, chunks, content_hash}}
+        self.structured_data_cache: Dict[str, Dict[str, Any]] = {}  # {content_hash: extracted data}
+        self._structured_data_pending: Dict[str, Future] = {}  # {content_hash: in-flight extraction}
+        self._aspect_emb_cache: Dict[Tuple[str, ...], np.ndarray] = {}  # {comparison aspects: query embeddings}
+
+        # Loaded once and shared by the single-document and every comparison vector store
+        set_search_threads(settings.FAISS_THREADS)
+
+        # Cached embeddings are only reusable for the same model and backend
+        self._embedding_id = f"{settings.EMBEDDING_MODEL}:{settings.EMBEDDING_BACKEND}:{settings.EMBEDDING_DIM}"
+        # Pass a shared model in so sessions don't each load their own
+        self._embedding = embedding if embedding is not None else get_embeddings(
+            settings.EMBEDDING_MODEL, settings.EMBEDDING_BACKEND, settings.CACHE_DIR, settings.EMBEDDING_DIM or None
         )
+        self.vector_store_manager = self._new_vector_store_manager()
 
         # Groq client - simple and reliable
-        self.groq_client = Groq(api_key=settings.GROQ_API_KEY)
+        self.groq_client = get_groq_client(settings.GROQ_API_KEY)
+        # Async client for fan-out calls; only ever awaited on the shared run_sync loop
+        self.async_groq_client = get_async_groq_client(settings.GROQ_API_KEY)
 
-        self.chat_histories: Dict[str, List[Dict[str, str]]] = {}
+        # Chat sessions started from this instance (one instance per browser session)
+        self.chat_histories: Dict[str, Deque[Dict[str, str]]] = {}
         self.document_stats = {}
 
-    def get_session_history(self, session_id: str) -> List[Dict[str, str]]:
-        if session_id not in self.chat_histories:
-            self.chat_histories[session_id] = []
-        return self.chat_histories[session_id]
+        # Answers persist across restarts, keyed by the processed document's content hash.
+        # Pass one shared instance to every model: its lock is what serialises writes to the shelve file
+        self.answer_cache = answer_cache if answer_cache is not None else self.new_answer_cache()
+        # Chunks + embeddings per PDF fingerprint, so re-uploads skip embedding entirely
+        self.embedding_cache = EmbeddingCache(os.path.join(settings.CACHE_DIR, "embeddings"))
+        # In-memory exact + semantic cache for the current single document
+        self.query_cache = QueryCache(
+            settings.QUERY_CACHE_MAX_SIZE,
+            settings.QUERY_CACHE_TTL,
+            similarity_threshold=settings.SEMANTIC_CACHE_THRESHOLD
+        )
 
-    def process_document(self, file_path: str) -> str:
-        """Process single document (existing functionality)"""
-        try:
-            chunks = self.document_processor.load_pdf(file_path)
+    @staticmethod
+    def new_answer_cache() -> AnswerCache:
+        return AnswerCache(
+            os.path.join(settings.CACHE_DIR, "answers"),
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ANSWER_CACHE_TTL
+        )
 
-            if not chunks:
-                raise ValueError("No text extracted from PDF")
+    def _new_vector_store_manager(self) -> VectorStoreManager:
+        return VectorStoreManager(
+            embeddings=self._embedding,
+            quantization=settings.VECTOR_QUANTIZATION,
+            hnsw_m=settings.HNSW_M,
+            ef_search=settings.HNSW_EF_SEARCH,
+            large_scale=settings.LARGE_SCALE_INDEX
+        )
 
-            chunks = [c for c in chunks if c.page_content.strip()]
-            if not chunks:
-                raise ValueError("No readable text after processing")
+    def get_session_history(self, session_id: str) -> Deque[Dict[str, str]]:
+        # Bounded so long sessions drop their oldest exchanges instead of growing forever
+        # setdefault is atomic, so concurrent first requests for a session share one deque
+        return self.chat_histories.setdefault(session_id, deque(maxlen=settings.MAX_TURNS * 2))
 
-            # Calculate stats
-            total_text = " ".join([c.page_content for c in chunks])
-            self.document_stats = {
-                "filename": os.path.basename(file_path),
-                "total_words": len(total_text.split()),
-                "total_characters": len(total_text),
-                "total_chunks": len(chunks),
-            }
+    def process_document(self, file_path: str) -> str:
+        """Process single document (existing functionality)"""
+        try:
+            return self._index_source(file_path, os.path.basename(file_path))
 
-            # Create vector store
-            self.vector_store_manager.create_vector_store(chunks)
+        except Exception as e:
+            return f"❌ Error: {str(e)}"
 
-            return (f"✅ Processed '{self.document_stats['filename']}'\n"
-                    f"📊 {self.document_stats['total_chunks']} chunks | "
-                    f"{self.document_stats['total_words']:,} words")
+    def process_document_bytes(self, data: Union[bytes, BinaryIO], filename: str) -> str:
+        """Process single document from uploaded PDF bytes or a binary file object"""
+        try:
+            return self._index_source(data, filename)
 
         except Exception as e:
             return f"❌ Error: {str(e)}"
 
-    # ==================== NEW: COMPARISON METHODS ====================
-
-    def process_multiple_documents(self, file_paths: List[str]) -> Dict[str, Any]:
-        """Process multiple documents for comparison with progress tracking"""
-        results = {}
-        total_files = len(file_paths)
+    def _index_source(self, source: Union[str, bytes, BinaryIO], filename: str) -> str:
+        """Load and embed a PDF, or reuse its cached chunks and embeddings"""
+        key = self.document_processor.fingerprint(source, self._embedding_id)
+        cached = self.embedding_cache.get(key)
+
+        if cached is not None:
+            chunks, embeddings = cached
+        else:
+            chunks = self._readable_chunks(self.document_processor.load_source(source, filename))
+            embeddings = self.vector_store_manager.embed_documents([c.page_content for c in chunks])
+            self.embedding_cache.set(key, chunks, embeddings)
+
+        return self._index_document(chunks, embeddings, filename)
+
+    @staticmethod
+    def _readable_chunks(chunks: List[Document]) -> List[Document]:
+        if not chunks:
+            raise ValueError("No text extracted from PDF")
+
+        chunks = [c for c in chunks if has_text(c.page_content)]
+        if not chunks:
+            raise ValueError("No readable text after processing")
+
+        return chunks
+
+    def _index_document(self, chunks: List[Document], embeddings: np.ndarray, filename: str) -> str:
+        """Build the single-document vector store and stats from embedded chunks"""
+        # Calculate stats
+        total_words, total_characters = self._chunk_stats(chunks)
+        self.document_stats = {
+            "filename": filename,
+            "total_words": total_words,
+            "total_characters": total_characters,
+            "total_chunks": len(chunks),
+            "content_hash": self._content_hash(chunks),
+        }
+
+        # Create vector store; answers cached for the previous document no longer apply
+        self.vector_store_manager.create_vector_store_from_embeddings(chunks, embeddings)
+        self.query_cache.clear()
+
+        return (f"✅ Processed '{self.document_stats['filename']}'\n"
+                f"📊 {self.document_stats['total_chunks']} chunks | "
+                f"{self.document_stats['total_words']:,} words")
 
-        for idx, file_path in enumerate(file_paths, 1):
-            doc_id = os.path.basename(file_path).replace('.pdf', '').replace(' ', '_')
+    # ==================== NEW: COMPARISON METHODS ====================
 
-            print(f"[{idx}/{total_files}] Processing: {os.path.basename(file_path)}")
+    @staticmethod
+    def _comparison_doc_id(filename: str) -> str:
+        return filename.replace('.pdf', '').replace(' ', '_')
 
-            try:
-                # Process each document
-                chunks = self.document_processor.load_pdf(file_path)
+    def _register_comparison_document(self, filename: str, chunks: List[Document],
+                                      embeddings: np.ndarray) -> Dict[str, Any]:
+        """Build the vector store for one comparison document from precomputed embeddings"""
+        doc_id = self._comparison_doc_id(filename)
 
-                if not chunks:
-                    results[doc_id] = {'status': 'error', 'error': 'No text extracted'}
-                    continue
+        try:
+            # Calculate stats
+            total_words, total_characters = self._chunk_stats(chunks)
+
+            # Create separate vector store for this document
+            doc_vector_store = self._new_vector_store_manager()
+            doc_vector_store.create_vector_store_from_embeddings(chunks, embeddings)
+
+            print(f"✅ Completed: {filename}")
+
+            # Store document info
+            self.documents[doc_id] = {
+                'filename': filename,
+                'chunks': chunks,
+                'content_hash': self._content_hash(chunks),
+                'stats': {
+                    'total_words': total_words,
+                    'total_characters': total_characters,
+                    'total_chunks': len(chunks)
+                },
+                'vector_store': doc_vector_store
+            }
 
-                chunks = [c for c in chunks if c.page_content.strip()]
+            return {
+                'status': 'success',
+                'filename': filename,
+                'stats': self.documents[doc_id]['stats']
+            }
 
-                if not chunks:
-                    results[doc_id] = {'status': 'error', 'error': 'No readable text'}
-                    continue
+        except Exception as e:
+            print(f"❌ Error processing {filename}: {str(e)}")
+            return {
+                'status': 'error',
+                'error': str(e)
+            }
 
-                print(f"[{idx}/{total_files}] Creating embeddings for {len(chunks)} chunks...")
+    def _load_and_embed(self, sources: List[Tuple[str, Union[str, bytes, BinaryIO]]]
+                        ) -> Iterator[Tuple[str, Optional[List[Document]], Optional[np.ndarray], Optional[str]]]:
+        """Parse PDFs on worker threads while one consumer embeds their chunks in micro-batches
+
+        Yields (filename, chunks, embeddings, error) on the caller's thread as each document finishes.
+        """
+        finished: SimpleQueue = SimpleQueue()
+        future = submit(self._load_and_embed_async(sources, finished.put))
+        # Wakes the loop below even if the pipeline itself fails
+        future.add_done_callback(lambda _: finished.put(None))
+        while True:
+            item = finished.get()
+            if item is None:
+                break
+            yield item
+        future.result()
+
+    async def _load_and_embed_async(self, sources: List[Tuple[str, Union[str, bytes, BinaryIO]]],
+                                    emit: Callable[[tuple], None]):
+        loop = asyncio.get_running_loop()
+        # (filename, chunk text) pairs; a None text marks the end of that file's chunks
+        queue: asyncio.Queue = asyncio.Queue()
+        chunks_by_name: Dict[str, List[Document]] = {}
+
+        # {chunk text: row in the embedding matrix}; identical sections shared across CVs are embedded once
+        text_rows: Dict[str, int] = {}
+        batches: List[np.ndarray] = []
+
+        async def produce(pool: ThreadPoolExecutor, filename: str, source):
+            try:
+                chunks = await loop.run_in_executor(pool, self.document_processor.load_source, source, filename)
+            except Exception as e:
+                print(f"❌ Error processing {filename}: {str(e)}")
+                emit((filename, None, None, str(e)))
+                return
+            chunks_by_name[filename] = chunks
+            for chunk in chunks:
+                queue.put_nowait((filename, chunk.page_content))
+            queue.put_nowait((filename, None))
+
+        async def consume():
+            finished = False
+            while not finished:
+                # Block for the next chunk, then take whatever else is already queued, up to a batch
+                batch = []
+                ended = []
+                item = await queue.get()
+                while True:
+                    if item is None:
+                        finished = True
+                        break
+                    filename, text = item
+                    if text is None:
+                        ended.append(filename)
+                    elif text not in text_rows:
+                        text_rows[text] = len(text_rows)
+                        batch.append(text)
+                    if len(batch) >= settings.EMBED_BATCH_SIZE or queue.empty():
+                        break
+                    item = queue.get_nowait()
+
+                if batch:
+                    batches.append(await asyncio.to_thread(self.vector_store_manager.embed_documents, batch))
+                    print(f"Embedded {len(batch)} chunks ({len(text_rows)} unique so far)")
+
+                # Every chunk queued before a file's end marker now has its row embedded
+                if ended:
+                    if len(batches) > 1:
+                        batches[:] = [np.vstack(batches)]
+                    for filename in ended:
+                        chunks = chunks_by_name[filename]
+                        emit((filename, chunks, batches[0][[text_rows[c.page_content] for c in chunks]], None))
+
+        with ThreadPoolExecutor(max_workers=settings.PDF_LOAD_WORKERS) as pool:
+            consumer = asyncio.create_task(consume())
+            await asyncio.gather(*(produce(pool, filename, source) for filename, source in sources))
+            queue.put_nowait(None)
+            await consumer
+
+    def process_multiple_documents(self, file_paths: List[str],
+                                   progress_callback: Optional[Callable[[int, int, str], None]] = None
+                                   ) -> Dict[str, Any]:
+        """Process multiple documents for comparison with progress tracking"""
+        return self._process_many([(os.path.basename(path), path) for path in file_paths],
+                                  progress_callback)
+
+    def process_multiple_documents_bytes(self, files: List[Tuple[str, Union[bytes, BinaryIO]]],
+                                         progress_callback: Optional[Callable[[int, int, str], None]] = None
+                                         ) -> Dict[str, Any]:
+        """Process multiple uploaded (filename, PDF bytes or file object) pairs for comparison"""
+        return self._process_many(list(files), progress_callback)
+
+    def _process_many(self, sources: List[Tuple[str, Union[str, bytes, BinaryIO]]],
+                      progress_callback: Optional[Callable[[int, int, str], None]] = None
+                      ) -> Dict[str, Any]:
+        """Reuse cached embeddings, pipeline loading and embedding for the rest, then index each document"""
+        total_files = len(sources)
+        if not total_files:
+            return {}
 
-                # Calculate stats
-                total_text = " ".join([c.page_content for c in chunks])
+        results = {}
+        done = 0
+
+        def finish(filename: str, result: Dict[str, Any]):
+            # Runs on the caller's thread, so the callback may safely touch the UI
+            nonlocal done
+            results[filename] = result
+            if settings.PREFETCH_STRUCTURED_DATA and result['status'] == 'success':
+                # Visual Analytics needs this per document; overlap the LLM call with the rest of the batch
+                self.prefetch_structured_data([self._comparison_doc_id(filename)])
+            done += 1
+            print(f"[{done}/{total_files}] Finished: {filename}")
+            if progress_callback:
+                progress_callback(done, total_files, filename)
+
+        misses = []
+        keys = {}
+        for filename, source in sources:
+            print(f"Processing: {filename}")
+            try:
+                keys[filename] = self.document_processor.fingerprint(source, self._embedding_id)
+            except Exception as e:
+                finish(filename, {'status': 'error', 'error': str(e)})
+                continue
 
-                # Create separate vector store for this document
-                doc_vector_store = VectorStoreManager(
-                    embedding_model=settings.EMBEDDING_MODEL
-                )
-                doc_vector_store.create_vector_store(chunks)
-
-                print(f"[{idx}/{total_files}] ✅ Completed: {os.path.basename(file_path)}")
-
-                # Store document info
-                self.documents[doc_id] = {
-                    'filename': os.path.basename(file_path),
-                    'chunks': chunks,
-                    'total_text': total_text,
-                    'stats': {
-                        'total_words': len(total_text.split()),
-                        'total_characters': len(total_text),
-                        'total_chunks': len(chunks)
-                    },
-                    'vector_store': doc_vector_store
-                }
-
-                results[doc_id] = {
-                    'status': 'success',
-                    'filename': os.path.basename(file_path),
-                    'stats': self.documents[doc_id]['stats']
-                }
+            cached = self.embedding_cache.get(keys[filename])
+            if cached is not None:
+                print(f"Reusing cached embeddings for {filename}")
+                finish(filename, self._register_comparison_document(filename, *cached))
+            else:
+                misses.append((filename, source))
 
+        if misses:
+            try:
+                for filename, chunks, doc_embeddings, error in self._load_and_embed(misses):
+                    if error is not None:
+                        finish(filename, {'status': 'error', 'error': error})
+                        continue
+                    self.embedding_cache.set(keys[filename], chunks, doc_embeddings)
+                    finish(filename, self._register_comparison_document(filename, chunks, doc_embeddings))
             except Exception as e:
-                print(f"[{idx}/{total_files}] ❌ Error: {str(e)}")
-                results[doc_id] = {
-                    'status': 'error',
-                    'error': str(e)
-                }
+                print(f"❌ Error creating embeddings: {str(e)}")
+                for filename, _ in misses:
+                    if filename not in results:
+                        finish(filename, {'status': 'error', 'error': str(e)})
 
-        return results
+        # Keep results in upload order
+        return {self._comparison_doc_id(filename): results[filename] for filename, _ in sources}
 
     def compare_documents(self, doc_ids: List[str], comparison_aspects: List[str] = None) -> Dict[str, Any]:
         """Compare multiple documents on various aspects"""
@@ -148,62 +440,98 @@ class RAGModel:
                 "potential areas for growth"
             ]
 
-        comparison_results = {}
-
-        for aspect in comparison_aspects:
-            comparison_results[aspect] = {}
+        aspect_embs = self._aspect_embeddings(tuple(comparison_aspects))
+        return run_sync(self._compare_documents_async(doc_ids, comparison_aspects, aspect_embs))
 
-            for doc_id in doc_ids:
-                if doc_id not in self.documents:
-                    comparison_results[aspect][doc_id] = "Document not found"
-                    continue
+    def _aspect_embeddings(self, comparison_aspects: Tuple[str, ...]) -> np.ndarray:
+        """Embed each aspect query once per model (one per browser session) and reuse it for every document"""
+        if comparison_aspects not in self._aspect_emb_cache:
+            self._aspect_emb_cache[comparison_aspects] = self.vector_store_manager.embed_documents(
+                [f"information about {aspect}" for aspect in comparison_aspects]
+            )
+        return self._aspect_emb_cache[comparison_aspects]
+
+    async def _compare_documents_async(self, doc_ids: List[str], comparison_aspects: List[str],
+                                       aspect_embs: np.ndarray) -> Dict[str, Any]:
+        """Extract every aspect of each document in one call, with all documents in flight at once"""
+        results = await asyncio.gather(*(self._compare_one(doc_id, comparison_aspects, aspect_embs)
+                                         for doc_id in doc_ids),
+                                       return_exceptions=True)
+
+        comparison_results = {aspect: {} for aspect in comparison_aspects}
+        for doc_id, result in zip(doc_ids, results):
+            for aspect in comparison_aspects:
+                if isinstance(result, Exception):
+                    comparison_results[aspect][doc_id] = f"Error: {str(result)}"
+                else:
+                    comparison_results[aspect][doc_id] = result.get(aspect, "N/A")
 
-                try:
-                    # Get relevant information for this aspect
-                    doc_info = self.documents[doc_id]
-                    vector_store = doc_info['vector_store']
+        return comparison_results
 
-                    # Search for relevant content
-                    relevant_docs = vector_store.similarity_search(
-                        f"information about {aspect}",
-                        k=3
-                    )
-                    context = "\n".join([doc.page_content for doc in relevant_docs])
+    @staticmethod
+    def _aspect_key(aspect: str) -> str:
+        return "_".join(aspect.lower().split())
 
-                    # Use Groq to extract structured information
-                    prompt = f"""Analyze this document section and extract information about {aspect}.
-Be specific and concise. List key points as bullet points.
-
-Document section:
-{context[:1500]}
+    async def _compare_one(self, doc_id: str, comparison_aspects: List[str],
+                           aspect_embs: np.ndarray) -> Dict[str, str]:
+        """Extract all aspects from one document with a single JSON-mode completion"""
+        if doc_id not in self.documents:
+            return {aspect: "Document not found" for aspect in comparison_aspects}
+
+        # Get relevant information once for every aspect
+        vector_store = self.documents[doc_id]['vector_store']
+
+        # One ANN search around the aspects' centroid gives a shared candidate pool;
+        # FAISS is blocking, so run it off the event loop
+        centroid = aspect_embs.mean(axis=0)
+        candidates, cand_vecs = await asyncio.to_thread(
+            vector_store.search_with_vectors,
+            centroid / (np.linalg.norm(centroid) or 1.0),
+            k=12
+        )
 
-Extract information about {aspect}:"""
+        # Score every candidate against every aspect at once and keep each aspect's top 3
+        selected = set()
+        if candidates:
+            aspect_scores = cand_vecs @ aspect_embs.T
+            for column in aspect_scores.T:
+                selected.update(np.argsort(-column)[:3].tolist())
+        context = "\n".join(candidates[i].page_content for i in sorted(selected))
 
-                    messages = [
-                        {"role": "system",
-                         "content": "You are a document analyzer. Extract specific information concisely in bullet points."},
-                        {"role": "user", "content": prompt}
-                    ]
+        keys = {self._aspect_key(aspect): aspect for aspect in comparison_aspects}
+        key_list = "\n".join(f'- "{key}": {aspect}' for key, aspect in keys.items())
 
-                    response = self.groq_client.chat.completions.create(
-                        model=settings.LLM_MODEL,
-                        messages=messages,
-                        temperature=0.1,
-                        max_tokens=400,
-                    )
+        # Use Groq to extract structured information
+        messages = [
+            COMPARE_SYSTEM_MESSAGE,
+            {"role": "user", "content": COMPARE_TEMPLATE.format(key_list=key_list, context=context[:4000])}
+        ]
 
-                    comparison_results[aspect][doc_id] = response.choices[0].message.content.strip()
+        response = await self.async_groq_client.chat.completions.create(
+            model=settings.LLM_MODEL,
+            messages=messages,
+            temperature=0.1,
+            max_tokens=1500,
+            response_format={"type": "json_object"},
+        )
 
-                except Exception as e:
-                    comparison_results[aspect][doc_id] = f"Error: {str(e)}"
+        extracted = json.loads(response.choices[0].message.content)
 
-        return comparison_results
+        results = {}
+        for key, aspect in keys.items():
+            value = extracted.get(key, "N/A")
+            if isinstance(value, list):
+                value = "\n".join(f"- {item}" for item in value)
+            results[aspect] = str(value).strip()
+        return results
 
-    def get_recommendation(self, doc_ids: List[str], job_role: str = "") -> str:
-        """Get AI recommendation for which candidate/document is best"""
+    def get_recommendation(self, doc_ids: List[str], job_role: str = "",
+                           comparison_data: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Stream an AI recommendation for which candidate/document is best"""
 
-        # Gather all comparison data
-        comparison_data = self.compare_documents(doc_ids)
+        # Gather all comparison data, reusing an earlier comparison when given one
+        if comparison_data is None:
+            comparison_data = self.compare_documents(doc_ids)
 
         # Build comprehensive context
         context = "Document Comparison Analysis:\n\n"
@@ -218,102 +546,55 @@ Extract information about {aspect}:"""
         # Get recommendation
         role_context = f" for the role of '{job_role}'" if job_role else ""
 
-        prompt = f"""Based on the document comparison below, provide a comprehensive recommendation{role_context}.
-
-{context}
-
-Provide your analysis in this format:
-
-## Overall Recommendation
-[Which document/candidate is the strongest and why - be specific]
-
-## Individual Strengths
-[List key strengths of each candidate]
-
-## Best Fit Analysis
-[Explain which candidate is best suited and why]
-
-## Key Differentiators
-[What sets the top candidate apart]
-
-Be specific, actionable, and professional."""
-
         messages = [
-            {"role": "system", "content": "You are an expert analyst providing detailed, actionable recommendations."},
-            {"role": "user", "content": prompt}
+            RECOMMENDATION_SYSTEM_MESSAGE,
+            {"role": "user", "content": RECOMMENDATION_TEMPLATE.format(role_context=role_context, context=context)}
         ]
 
         try:
-            response = self.groq_client.chat.completions.create(
+            stream = self.groq_client.chat.completions.create(
                 model=settings.LLM_MODEL,
                 messages=messages,
                 temperature=0.2,
                 max_tokens=1200,
+                stream=True,
             )
 
-            return response.choices[0].message.content.strip()
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
 
         except Exception as e:
-            return f"Error generating recommendation: {str(e)}"
+            yield f"Error generating recommendation: {str(e)}"
 
     def extract_structured_data(self, doc_id: str) -> Dict[str, Any]:
         """Extract structured data from a document"""
+        return run_sync(self._extract_structured_data_async(doc_id))
 
+    async def _extract_structured_data_async(self, doc_id: str) -> Dict[str, Any]:
         if doc_id not in self.documents:
             return {"error": "Document not found"}
 
         doc_info = self.documents[doc_id]
-        text = doc_info['total_text'][:4000]
-
-        prompt = f"""Extract structured information from this document.
-    Provide a JSON response with these fields (use "N/A" if not found):
-    {{
-      "name": "Full name",
-      "email": "Email address",
-      "phone": "Phone number",
-      "skills": ["skill1", "skill2", "skill3"],
-      "experience_years": 0,
-      "education": ["degree1", "degree2"],
-      "certifications": ["cert1", "cert2"],
-      "key_achievements": ["achievement1", "achievement2", "achievement3"]
-    }}
-
-    Document text:
-    {text}
-
-    Respond with ONLY valid JSON, no other text."""
+        text = self._leading_text(doc_info['chunks'], 4000)
 
         messages = [
-            {"role": "system", "content": "You are a data extraction specialist. Return only valid JSON."},
-            {"role": "user", "content": prompt}
+            STRUCTURED_DATA_SYSTEM_MESSAGE,
+            {"role": "user", "content": STRUCTURED_DATA_TEMPLATE.format(text=text)}
         ]
 
         try:
-            response = self.groq_client.chat.completions.create(
+            # JSON mode guarantees a bare object, so no markdown fences to strip
+            response = await self.async_groq_client.chat.completions.create(
                 model=settings.LLM_MODEL,
                 messages=messages,
                 temperature=0.1,
                 max_tokens=800,
+                response_format={"type": "json_object"},
             )
 
-            result = response.choices.message.content.strip()
-
-            # Clean markdown code blocks
-            triple_backtick = "```"
-
-            if result.startswith(triple_backtick):
-                # Remove opening backticks
-                parts = result.split(triple_backtick, 1)
-                if len(parts) > 1:
-                    result = parts[1]
-
-                # Remove 'json' label if present
-                if result.startswith('json'):
-                    result = result[4:].strip()
-
-                # Remove closing backticks
-                if triple_backtick in result:
-                    result = result.split(triple_backtick)[0].strip()
+            result = response.choices[0].message.content
 
             # Parse and return JSON
             return json.loads(result)
@@ -326,9 +607,80 @@ Be specific, actionable, and professional."""
         except Exception as e:
             return {"error": f"Extraction failed: {str(e)}"}
 
+    async def _extract_and_memoise(self, doc_id: str, content_hash: str) -> Dict[str, Any]:
+        data = await self._extract_structured_data_async(doc_id)
+        # Only successful extractions are memoised so failures can be retried
+        if 'error' not in data:
+            self.structured_data_cache[content_hash] = data
+        return data
+
+    def _structured_data_future(self, doc_id: str) -> Future:
+        """Return the in-flight extraction for a document, starting one if needed"""
+        content_hash = self.documents[doc_id]['content_hash']
+        future = self._structured_data_pending.get(content_hash)
+        if future is None:
+            future = submit(self._extract_and_memoise(doc_id, content_hash))
+            self._structured_data_pending[content_hash] = future
+            future.add_done_callback(lambda _: self._structured_data_pending.pop(content_hash, None))
+        return future
+
+    def prefetch_structured_data(self, doc_ids: List[str]):
+        """Start extracting structured data in the background for documents not yet memoised"""
+        for doc_id in doc_ids:
+            doc_info = self.documents.get(doc_id)
+            if doc_info and doc_info['content_hash'] not in self.structured_data_cache:
+                self._structured_data_future(doc_id)
+
+    def extract_structured_data_batch(self, doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Extract structured data for several documents concurrently, reusing earlier or in-flight results"""
+        results = {}
+        pending = {}
+        for doc_id in doc_ids:
+            doc_info = self.documents.get(doc_id)
+            if not doc_info:
+                results[doc_id] = {"error": "Document not found"}
+                continue
+            cached = self.structured_data_cache.get(doc_info['content_hash'])
+            if cached:
+                results[doc_id] = cached
+            else:
+                pending[doc_id] = self._structured_data_future(doc_id)
+
+        for doc_id, future in pending.items():
+            results[doc_id] = future.result()
+
+        return {doc_id: results[doc_id] for doc_id in doc_ids}
+
+    @staticmethod
+    def _chunk_stats(chunks: List[Document]) -> Tuple[int, int]:
+        """Count words and characters chunk by chunk instead of joining the whole document"""
+        total_words = sum(len(c.page_content.split()) for c in chunks)
+        total_characters = sum(len(c.page_content) for c in chunks)
+        return total_words, total_characters
+
+    @staticmethod
+    def _leading_text(chunks: List[Document], limit: int) -> str:
+        """Join only as many chunks as needed to fill the first `limit` characters"""
+        parts, size = [], 0
+        for chunk in chunks:
+            if size >= limit:
+                break
+            parts.append(chunk.page_content)
+            size += len(chunk.page_content) + 1
+        return " ".join(parts)[:limit]
+
+    @staticmethod
+    def _content_hash(chunks: List[Document]) -> str:
+        """Fingerprint a document by the text of its chunks"""
+        digest = hashlib.sha256()
+        for chunk in chunks:
+            digest.update(chunk.page_content.encode('utf-8'))
+        return digest.hexdigest()
+
     def clear_comparison_data(self):
         """Clear all comparison documents"""
         self.documents = {}
+        self.query_cache.clear()
         return "Comparison data cleared"
 
     # ==================== END COMPARISON METHODS ====================
@@ -344,80 +696,174 @@ Be specific, actionable, and professional."""
 
         try:
             # Handle statistics questions
-            ql = question.lower().strip()
-            if any(kw in ql for kw in ["how many words", "word count", "total words", "page count", "document size"]):
-                if self.document_stats:
-                    s = self.document_stats
-                    answer = (
-                        f"**Document Statistics:**\n\n"
-                        f"📄 File: {s['filename']}\n"
-                        f"📊 Total Words: {s['total_words']:,}\n"
-                        f"🔤 Characters: {s['total_characters']:,}\n"
-                        f"📑 Chunks: {s['total_chunks']}"
-                    )
-
-                    history = self.get_session_history(session_id)
-                    history.append({"role": "user", "content": question})
-                    history.append({"role": "assistant", "content": answer})
-
-                    return {"answer": answer, "sources": ["Calculated from document"], "session_id": session_id}
-
-            # Retrieve relevant chunks
-            relevant_docs = self.vector_store_manager.similarity_search(question, k=6)
-            context = "\n\n".join([doc.page_content for doc in relevant_docs])
-
-            # Build messages for Groq
-            system_prompt = """You are a document assistant. Answer using ONLY the provided context.
+            answer = self._statistics_answer(question)
+            if answer:
+                self._record_exchange(session_id, question, answer)
+                return {"answer": answer, "sources": ["Calculated from document"], "session_id": session_id}
 
-Rules:
-- Extract facts, names, dates, numbers from context
-- If asked for summary, cover main points
-- If asked for details, be specific
-- If not in context, say: "I cannot find that information"
-- Do not add information not in context"""
+            # The QA prompt does not include chat history, so document + question fully determine the answer
+            fingerprint = self.document_stats["content_hash"]
+            cached, q_emb = self._cached_answer(fingerprint, question)
+            if cached:
+                self._record_exchange(session_id, question, cached["answer"])
+                return {**cached, "session_id": session_id}
 
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}\n\nAnswer:"}
-            ]
+            # Retrieve relevant chunks, reusing the embedding computed for the cache lookup
+            relevant_docs = self.vector_store_manager.similarity_search_by_vector(q_emb, k=6)
 
             # Call Groq API
             response = self.groq_client.chat.completions.create(
                 model=settings.LLM_MODEL,
-                messages=messages,
+                messages=self._build_qa_messages(question, relevant_docs),
                 temperature=0.1,
                 max_tokens=1024,
             )
 
-            answer = response.choices[0].message.content.strip()
-
-            # Clean answer
-            for prefix in ["Answer:", "Response:", "A:"]:
-                if answer.startswith(prefix):
-                    answer = answer[len(prefix):].strip()
-                    break
+            answer = self._clean_answer(response.choices[0].message.content)
 
             # Get sources
             sources = [f"{doc.page_content[:200]}..." for doc in relevant_docs[:3]]
 
             # Update history
-            history = self.get_session_history(session_id)
-            history.append({"role": "user", "content": question})
-            history.append({"role": "assistant", "content": answer})
+            self._record_exchange(session_id, question, answer)
+            self._remember_answer(fingerprint, question, q_emb, answer, sources)
 
             return {"answer": answer, "sources": sources, "session_id": session_id}
 
         except Exception as e:
             return {"answer": f"Error: {str(e)}", "sources": [], "session_id": session_id}
 
-    def get_chat_history(self, session_id: str = "default") -> List[Dict[str, str]]:
+    def ask_question_stream(self, question: str, session_id: str = "default") -> Dict[str, Any]:
+        """Ask question and stream the answer; sources are available before the first token"""
+        if not self.vector_store_manager.vector_store:
+            return {
+                "answer_stream": iter(["Please upload and process a document first."]),
+                "sources": [],
+                "session_id": session_id
+            }
+
+        try:
+            answer = self._statistics_answer(question)
+            if answer:
+                self._record_exchange(session_id, question, answer)
+                return {"answer_stream": iter([answer]), "sources": ["Calculated from document"],
+                        "session_id": session_id}
+
+            fingerprint = self.document_stats["content_hash"]
+            cached, q_emb = self._cached_answer(fingerprint, question)
+            if cached:
+                self._record_exchange(session_id, question, cached["answer"])
+                return {"answer_stream": iter([cached["answer"]]), "sources": cached["sources"],
+                        "session_id": session_id}
+
+            relevant_docs = self.vector_store_manager.similarity_search_by_vector(q_emb, k=6)
+            sources = [f"{doc.page_content[:200]}..." for doc in relevant_docs[:3]]
+
+            stream = self.groq_client.chat.completions.create(
+                model=settings.LLM_MODEL,
+                messages=self._build_qa_messages(question, relevant_docs),
+                temperature=0.1,
+                max_tokens=1024,
+                stream=True,
+            )
+
+            return {
+                "answer_stream": self._stream_answer(stream, question, session_id, fingerprint, q_emb, sources),
+                "sources": sources,
+                "session_id": session_id
+            }
+
+        except Exception as e:
+            return {"answer_stream": iter([f"Error: {str(e)}"]), "sources": [], "session_id": session_id}
+
+    def _stream_answer(self, stream, question: str, session_id: str,
+                       fingerprint: str, q_emb: np.ndarray, sources: List[str]) -> Iterator[str]:
+        """Yield streamed completion tokens, then record the full exchange in history and cache"""
+        parts = []
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            yield f"\n\nError: {str(e)}"
+            return
+
+        answer = self._clean_answer("".join(parts))
+        self._record_exchange(session_id, question, answer)
+        self._remember_answer(fingerprint, question, q_emb, answer, sources)
+
+    def _cached_answer(self, fingerprint: str, question: str) -> Tuple[Optional[Dict[str, Any]], np.ndarray]:
+        """Look a question up in the in-memory semantic cache, then the disk cache"""
+        cached, q_emb = self.query_cache.lookup(question, self.vector_store_manager.embed_query)
+        if cached:
+            return cached, q_emb
+
+        cached = self.answer_cache.get(fingerprint, question)
+        if cached:
+            self.query_cache.set(question, q_emb, cached["answer"], cached["sources"])
+        return cached, q_emb
+
+    def _remember_answer(self, fingerprint: str, question: str, q_emb: np.ndarray,
+                         answer: str, sources: List[str]):
+        """Store a fresh answer in both cache tiers"""
+        self.query_cache.set(question, q_emb, answer, sources)
+        self.answer_cache.set(fingerprint, question, answer, sources)
+
+    def _statistics_answer(self, question: str) -> Optional[str]:
+        """Answer document-size questions from precomputed stats, without the LLM"""
+        ql = question.lower().strip()
+        if any(kw in ql for kw in ["how many words", "word count", "total words", "page count", "document size"]):
+            if self.document_stats:
+                s = self.document_stats
+                return (
+                    f"**Document Statistics:**\n\n"
+                    f"📄 File: {s['filename']}\n"
+                    f"📊 Total Words: {s['total_words']:,}\n"
+                    f"🔤 Characters: {s['total_characters']:,}\n"
+                    f"📑 Chunks: {s['total_chunks']}"
+                )
+        return None
+
+    def _build_qa_messages(self, question: str, relevant_docs: List[Document]) -> List[Dict[str, str]]:
+        """Build the Groq chat messages for a context-grounded answer"""
+        context = "\n\n".join([doc.page_content for doc in relevant_docs])
+
+        return [
+            QA_SYSTEM_MESSAGE,
+            {"role": "user", "content": QA_TEMPLATE.format(context=context, question=question)}
+        ]
+
+    @staticmethod
+    def _clean_answer(answer: str) -> str:
+        """Strip a leading 'Answer:'-style label from a completion"""
+        answer = answer.strip()
+        for prefix in ["Answer:", "Response:", "A:"]:
+            if answer.startswith(prefix):
+                return answer[len(prefix):].strip()
+        return answer
+
+    def _record_exchange(self, session_id: str, question: str, answer: str):
+        """Append a question/answer pair to the session history"""
+        history = self.get_session_history(session_id)
+        history.append({"role": "user", "content": question})
+        history.append({"role": "assistant", "content": answer})
+
+    def get_chat_history(self, session_id: str = "default") -> Deque[Dict[str, str]]:
         return self.get_session_history(session_id)
 
     def clear_chat_history(self, session_id: str = "default") -> str:
         if session_id in self.chat_histories:
-            self.chat_histories[session_id] = []
+            self.chat_histories[session_id].clear()
             return f"Chat history cleared for session: {session_id}"
         return f"No chat history found for session: {session_id}"
 
     def list_active_sessions(self) -> List[str]:
         return list(self.chat_histories.keys())
+
+    def get_all_chat_histories(self, session_ids: Optional[List[str]] = None) -> Dict[str, Deque[Dict[str, str]]]:
+        """Fetch several session histories in one pass (all sessions by default)"""
+        if session_ids is None:
+            return dict(self.chat_histories)
+        return {session_id: self.chat_histories.get(session_id, deque()) for session_id in session_ids}
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import shelve
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class AnswerCache:
+    """Disk-backed cache of answers keyed by document fingerprint and question."""
+
+    # When full, evict down to this fraction of max_entries
+    EVICT_TO = 0.9
+
+    def __init__(self, path: str, max_entries: int = 500, ttl_seconds: int = 3600):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(doc_fingerprint: str, question: str) -> str:
+        normalized = " ".join(question.lower().split())
+        return hashlib.sha256(f"{doc_fingerprint}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, doc_fingerprint: str, question: str) -> Optional[Dict[str, Any]]:
+        """Return the cached answer and sources, or None on a miss or expired entry."""
+        key = self._key(doc_fingerprint, question)
+        try:
+            with self._lock, shelve.open(self.path) as db:
+                entry = db.get(key)
+                if entry is None:
+                    return None
+                if time.time() - entry["ts"] > self.ttl_seconds:
+                    del db[key]
+                    return None
+                return {"answer": entry["answer"], "sources": entry["sources"]}
+        except Exception:
+            # A broken or unwritable cache must never block answering
+            return None
+
+    def set(self, doc_fingerprint: str, question: str, answer: str, sources: List[str]):
+        """Store an answer, evicting the oldest entries beyond max_entries."""
+        key = self._key(doc_fingerprint, question)
+        try:
+            with self._lock, shelve.open(self.path) as db:
+                db[key] = {"answer": answer, "sources": sources, "ts": time.time()}
+                if len(db) > self.max_entries:
+                    # Reading every entry's timestamp is the expensive part, so free 10% headroom
+                    # at once instead of scanning again on every following set
+                    keep = int(self.max_entries * self.EVICT_TO)
+                    oldest = sorted(db.keys(), key=lambda k: db[k]["ts"])[:len(db) - keep]
+                    for old_key in oldest:
+                        del db[old_key]
+        except Exception:
+            pass
@@ -0,0 +1,31 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) an event loop on a daemon thread that lives for the whole process."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="aida-async-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """Run a coroutine on the shared loop and block until it finishes.
+
+    Async clients keep connection pools bound to the loop they first ran on, so
+    reusing one loop (instead of asyncio.run per call) keeps them valid.
+    """
+    return submit(coro).result()
+
+
+def submit(coro: Coroutine) -> Future:
+    """Schedule a coroutine on the shared loop without waiting for it."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
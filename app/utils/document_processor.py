@@ -1,13 +1,49 @@
 import sys
 import os
-from typing import List
+import hashlib
+import shutil
+import tempfile
+import threading
+from io import BytesIO
+from typing import List, BinaryIO, Union
+from pypdf import PdfReader
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # Fall back to the pure-Python pypdf parsers
+    pdfium = None
+
+# PDFium is not thread-safe, so every call into it is serialised
+_PDFIUM_LOCK = threading.Lock()
+# Parsers extract different text, so chunks cached under one must not be served under the other
+PDF_PARSER = "pypdfium2" if pdfium is not None else "pypdf"
+
+
+def has_text(text: str) -> bool:
+    """True if text has any non-whitespace character; unlike .strip() it allocates nothing."""
+    return bool(text) and not text.isspace()
+
+
+def unique_chunks(chunks: List[Document]) -> List[Document]:
+    """Drop chunks whose text repeats an earlier one (shared headers/footers), keeping the first."""
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        digest = hashlib.blake2b(chunk.page_content.encode("utf-8"), digest_size=16).digest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(chunk)
+    return unique
+
 
 class DocumentProcessor:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, spill_threshold_mb: int = 8):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.spill_threshold_bytes = spill_threshold_mb * 1024 * 1024
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
@@ -22,32 +58,121 @@ class DocumentProcessor:
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"PDF file not found: {file_path}")
 
-            loader = PyPDFLoader(file_path)
-            pages = loader.load()
-
-            # NEW: Check if any text was extracted
-            if not pages:
-                raise ValueError("PDF loaded but contains no pages")
+            if pdfium is not None:
+                pages = self._pdfium_pages(file_path, file_path)
+            else:
+                loader = PyPDFLoader(file_path)
+                pages = loader.load()
 
-            # NEW: Check if pages have content
-            total_text = "".join([page.page_content for page in pages])
-            if not total_text.strip():
-                raise ValueError("PDF contains no extractable text. It may be an image-based PDF requiring OCR.")
+            return self._split_pages(pages)
 
-            # Split documents into chunks
-            chunks = self.text_splitter.split_documents(pages)
+        except Exception as e:
+            raise Exception(f"Error processing PDF: {str(e)}")
 
-            # NEW: Filter empty chunks
-            chunks = [chunk for chunk in chunks if chunk.page_content.strip()]
+    def load_pdf_bytes(self, data: bytes, filename: str) -> List[Document]:
+        """Load and split an in-memory PDF into chunks without touching disk."""
+        return self.load_pdf_stream(BytesIO(data), filename)
 
-            if not chunks:
-                raise ValueError("Document splitting produced no valid chunks")
+    def load_pdf_stream(self, stream: BinaryIO, filename: str) -> List[Document]:
+        """Load and split a PDF from a seekable binary file object."""
+        try:
+            if pdfium is not None:
+                pages = self._pdfium_pages(stream, filename)
+            else:
+                reader = PdfReader(stream)
+                pages = [
+                    Document(page_content=page.extract_text() or "", metadata={"source": filename, "page": idx})
+                    for idx, page in enumerate(reader.pages)
+                ]
 
-            return chunks
+            return self._split_pages(pages)
 
         except Exception as e:
             raise Exception(f"Error processing PDF: {str(e)}")
 
+    @staticmethod
+    def _pdfium_pages(source: Union[str, BinaryIO], name: str) -> List[Document]:
+        """Extract per-page text with PDFium (native code, much faster than pypdf)."""
+        pages = []
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(source)
+            try:
+                for idx in range(len(pdf)):
+                    page = pdf[idx]
+                    textpage = page.get_textpage()
+                    text = textpage.get_text_range().replace("\r\n", "\n")
+                    textpage.close()
+                    page.close()
+                    pages.append(Document(page_content=text, metadata={"source": name, "page": idx}))
+            finally:
+                pdf.close()
+        return pages
+
+    def load_pdf_upload(self, data: Union[bytes, BinaryIO], filename: str) -> List[Document]:
+        """Parse an upload in memory, streaming it to a temp file only when it is large."""
+        stream = BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(0)
+
+        if size <= self.spill_threshold_bytes:
+            return self.load_pdf_stream(stream, filename)
+
+        # Copy in 1 MB chunks rather than materialising the whole upload as bytes
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+            shutil.copyfileobj(stream, tmp_file, length=1024 * 1024)
+            tmp_file_path = tmp_file.name
+
+        try:
+            return self.load_pdf(tmp_file_path)
+        finally:
+            os.unlink(tmp_file_path)
+
+    def load_source(self, source: Union[str, bytes, BinaryIO], filename: str) -> List[Document]:
+        """Load and split a PDF given either its path or its uploaded contents."""
+        if isinstance(source, str):
+            return self.load_pdf(source)
+        return self.load_pdf_upload(source, filename)
+
+    def fingerprint(self, source: Union[str, bytes, BinaryIO], model_name: str) -> str:
+        """Hash the raw PDF together with the parser, chunking and embedding settings that shape its index."""
+        digest = hashlib.sha256()
+        if isinstance(source, (bytes, bytearray)):
+            digest.update(source)
+        elif isinstance(source, str):
+            with open(source, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        else:
+            source.seek(0)
+            for block in iter(lambda: source.read(1024 * 1024), b""):
+                digest.update(block)
+            source.seek(0)
+
+        digest.update(f"\0{PDF_PARSER}\0{self.chunk_size}\0{self.chunk_overlap}\0{model_name}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _split_pages(self, pages: List[Document]) -> List[Document]:
+        """Validate extracted pages and split them into non-empty chunks."""
+        # NEW: Check if any text was extracted
+        if not pages:
+            raise ValueError("PDF loaded but contains no pages")
+
+        # NEW: Check if pages have content
+        if not any(has_text(page.page_content) for page in pages):
+            raise ValueError("PDF contains no extractable text. It may be an image-based PDF requiring OCR.")
+
+        # Split documents into chunks
+        chunks = self.text_splitter.split_documents(pages)
+
+        # NEW: Filter empty chunks; repeated ones would only cost another encoder pass
+        chunks = unique_chunks([chunk for chunk in chunks if has_text(chunk.page_content)])
+
+        if not chunks:
+            raise ValueError("Document splitting produced no valid chunks")
+
+        return chunks
+
     def process_text(self, text: str) -> List[Document]:
         """Process raw text into chunks."""
         if not text.strip():
@@ -0,0 +1,49 @@
+import functools
+import os
+import pickle
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+@functools.lru_cache(maxsize=16)
+def _read_entry(path: str, mtime: float) -> Tuple[List[Document], np.ndarray]:
+    # mtime is part of the key so a rewritten file is never served stale
+    with open(path, "rb") as f:
+        entry = pickle.load(f)
+    return entry["chunks"], entry["embeddings"]
+
+
+class EmbeddingCache:
+    """On-disk store of a PDF's chunks and their embeddings, keyed by a content fingerprint."""
+
+    def __init__(self, cache_dir: str):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Tuple[List[Document], np.ndarray]]:
+        """Return (chunks, embeddings) for a fingerprint, or None on a miss."""
+        path = self._path(key)
+        try:
+            return _read_entry(path, os.path.getmtime(path))
+        except Exception:
+            # Missing or unreadable entries are simply re-embedded
+            return None
+
+    def set(self, key: str, chunks: List[Document], embeddings: np.ndarray):
+        """Write an entry atomically so concurrent readers never see a partial file."""
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"chunks": chunks, "embeddings": np.asarray(embeddings, dtype=np.float32)},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
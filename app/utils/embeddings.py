@@ -0,0 +1,163 @@
+import functools
+import os
+import threading
+import weakref
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+# One embedding model per (name, backend, dim), shared by every VectorStoreManager that is still alive
+_instances: "weakref.WeakValueDictionary[tuple, Embeddings]" = weakref.WeakValueDictionary()
+_lock = threading.Lock()
+
+
+def _device() -> str:
+    return 'cuda' if torch is not None and torch.cuda.is_available() else 'cpu'
+
+
+def _use_half_precision(embeddings: HuggingFaceEmbeddings):
+    """Cast the loaded SentenceTransformer to fp16; only called on CUDA, where it halves memory and latency."""
+    # sentence-transformers 2.x has no model_kwargs/torch_dtype option, so convert after loading
+    client = getattr(embeddings, "_client", None)
+    if client is not None:
+        client.half()
+
+
+def _encode_batch_size(device: str) -> int:
+    # Large batches keep GPU matmul units busy; on CPU they only spill activations out of cache
+    return 128 if device == 'cuda' else 16
+
+
+def _use_inference_mode(embeddings: HuggingFaceEmbeddings):
+    """Run the wrapped SentenceTransformer.encode under torch.inference_mode (no autograd bookkeeping)."""
+    client = getattr(embeddings, "_client", None)
+    if torch is None or client is None:
+        return
+    encode = client.encode
+
+    @functools.wraps(encode)
+    def encode_no_grad(*args, **kwargs):
+        with torch.inference_mode():
+            return encode(*args, **kwargs)
+
+    client.encode = encode_no_grad
+
+
+class ORTQuantizedEmbeddings(Embeddings):
+    """Sentence-transformer encoder exported to ONNX and dynamically quantized to INT8."""
+
+    def __init__(self, model_name: str, cache_dir: str, batch_size: int = 64):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        # Export + quantize once; later loads reuse the saved INT8 graph
+        model_dir = os.path.join(cache_dir, model_name.replace("/", "__") + "-int8")
+        if not os.path.exists(os.path.join(model_dir, "model_quantized.onnx")):
+            quantizer = ORTQuantizer.from_pretrained(
+                ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            )
+            # Per-channel INT8 weights, activations scaled per tensor at runtime
+            quantizer.quantize(
+                save_dir=model_dir,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=True)
+            )
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(model_dir)
+
+        self.model = ORTModelForFeatureExtraction.from_pretrained(model_dir, file_name="model_quantized.onnx")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        # BGE models are trained with CLS pooling; MiniLM-style sentence-transformers use mean pooling
+        self.cls_pooling = "bge" in model_name.lower()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(texts[start:start + self.batch_size], padding=True,
+                                    truncation=True, return_tensors="np")
+            hidden = self.model(**inputs).last_hidden_state
+            if self.cls_pooling:
+                pooled = hidden[:, 0]
+            else:
+                # Mean pooling over real tokens, as sentence-transformers does for MiniLM
+                mask = inputs["attention_mask"][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled / np.linalg.norm(pooled, axis=1, keepdims=True))
+        return np.vstack(batches).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts).tolist() if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+class NormalizedEmbeddings(Embeddings):
+    """L2-normalise another model's vectors in one NumPy pass, optionally keeping only the first dim components."""
+
+    def __init__(self, base: Embeddings, dim: Optional[int] = None):
+        self.base = base
+        self.dim = dim
+
+    def _normalize(self, vecs) -> np.ndarray:
+        vecs = np.asarray(vecs, dtype=np.float32)
+        if self.dim:
+            vecs = vecs[..., :self.dim]
+        vecs = np.array(vecs, dtype=np.float32, order="C")
+        np.divide(vecs, np.linalg.norm(vecs, axis=-1, keepdims=True).clip(1e-12), out=vecs)
+        return vecs
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._normalize(self.base.embed_documents(texts)).tolist() if texts else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._normalize(self.base.embed_query(text)).tolist()
+
+
+def get_embeddings(model_name: str, backend: str = "torch", cache_dir: Optional[str] = None,
+                   dim: Optional[int] = None) -> Embeddings:
+    """Return the pooled embedding model for model_name, loading it on first use.
+
+    backend="onnx-int8" uses ORTQuantizedEmbeddings when optimum is installed.
+    dim truncates every vector to its first dim components (None keeps the full width).
+    """
+    key = (model_name, backend, dim)
+    with _lock:
+        embeddings = _instances.get(key)
+        if embeddings is None:
+            if backend == "onnx-int8":
+                try:
+                    embeddings = ORTQuantizedEmbeddings(
+                        model_name, os.path.join(cache_dir or os.path.expanduser("~/.cache/aida"), "onnx")
+                    )
+                    if dim:
+                        embeddings = NormalizedEmbeddings(embeddings, dim)
+                except ImportError:
+                    embeddings = None  # optimum[onnxruntime] not installed
+
+            if embeddings is None:
+                # IMPROVED: Better embedding model (optional upgrade)
+                # You can also use: "sentence-transformers/all-mpnet-base-v2" for better quality
+                device = _device()
+                embeddings = HuggingFaceEmbeddings(
+                    model_name=model_name,
+                    model_kwargs={'device': device},
+                    encode_kwargs={
+                        'normalize_embeddings': False,  # Normalised below, over the whole batch at once
+                        'batch_size': _encode_batch_size(device),
+                        'convert_to_numpy': True
+                    }
+                )
+                if device == 'cuda':
+                    _use_half_precision(embeddings)
+                _use_inference_mode(embeddings)
+                embeddings = NormalizedEmbeddings(embeddings, dim)
+            _instances[key] = embeddings
+        return embeddings
@@ -0,0 +1,68 @@
+from typing import Tuple
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba is optional; the NumPy path gives the same results
+    numba = None
+
+
+def _topk_cosine_numpy(mat: np.ndarray, q: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    norms = np.linalg.norm(mat, axis=1) * (np.linalg.norm(q) or 1.0)
+    scores = mat @ q / np.where(norms == 0, 1.0, norms)
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _topk_cosine_numba(mat, q, k):
+        n, d = mat.shape
+        q_norm = np.sqrt(np.sum(q * q))
+        if q_norm == 0.0:
+            q_norm = 1.0
+
+        # Norm and dot product fused into one pass over each row
+        scores = np.empty(n, dtype=np.float32)
+        for i in numba.prange(n):
+            dot = 0.0
+            sq = 0.0
+            for j in range(d):
+                dot += mat[i, j] * q[j]
+                sq += mat[i, j] * mat[i, j]
+            norm = np.sqrt(sq) * q_norm
+            scores[i] = dot / norm if norm > 0.0 else 0.0
+
+        # k is tiny, so keep a sorted insertion buffer instead of sorting all n scores
+        k = min(k, n)
+        top_idx = np.full(k, -1, dtype=np.int64)
+        top_val = np.full(k, -np.inf, dtype=np.float32)
+        for i in range(n):
+            s = scores[i]
+            if s > top_val[k - 1]:
+                pos = k - 1
+                while pos > 0 and top_val[pos - 1] < s:
+                    top_val[pos] = top_val[pos - 1]
+                    top_idx[pos] = top_idx[pos - 1]
+                    pos -= 1
+                top_val[pos] = s
+                top_idx[pos] = i
+        return top_idx, top_val
+
+
+def topk_cosine(mat: np.ndarray, q: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (row indices, cosine scores) of the k rows of mat most similar to q, best first."""
+    if len(mat) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    if numba is not None:
+        return _topk_cosine_numba(np.ascontiguousarray(mat, dtype=np.float32),
+                                  np.ascontiguousarray(q, dtype=np.float32), k)
+    return _topk_cosine_numpy(mat, q, k)
+
+
+def warmup(dim: int = 8):
+    """Trigger JIT compilation up front so the first real lookup doesn't pay for it."""
+    topk_cosine(np.ones((2, dim), dtype=np.float32), np.ones(dim, dtype=np.float32), 1)
@@ -0,0 +1,22 @@
+import functools
+import importlib.util
+
+import httpx
+from groq import Groq, AsyncGroq
+
+# Keep connections warm between calls instead of re-negotiating TLS each time
+_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=50)
+# httpx only speaks HTTP/2 when the optional h2 package is installed
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+@functools.lru_cache(maxsize=None)
+def get_groq_client(api_key: str) -> Groq:
+    """Process-wide sync Groq client with a keep-alive connection pool."""
+    return Groq(api_key=api_key, http_client=httpx.Client(limits=_LIMITS, http2=_HTTP2))
+
+
+@functools.lru_cache(maxsize=None)
+def get_async_groq_client(api_key: str) -> AsyncGroq:
+    """Process-wide async Groq client; only await it on the shared run_sync loop."""
+    return AsyncGroq(api_key=api_key, http_client=httpx.AsyncClient(limits=_LIMITS, http2=_HTTP2))
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.fast_cos import topk_cosine, warmup
+
+
+class QueryCache:
+    """Thread-safe LRU answer cache with exact-match and semantic (cosine) lookup."""
+
+    def __init__(self, max_size: int = 2000, ttl_seconds: int = 600, similarity_threshold: float = 0.95):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        # {question hash: (answer, sources, timestamp)}, in recency order
+        self._entries: "OrderedDict[str, Tuple[str, List[str], float]]" = OrderedDict()
+        # Unit-normalised question embeddings, one row per entry; _emb_keys[i] owns row i
+        self._emb_matrix: Optional[np.ndarray] = None
+        self._emb_keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Compile the similarity kernel now rather than on the first question
+        warmup()
+
+    @staticmethod
+    def _hash(question: str) -> str:
+        return hashlib.sha256(" ".join(question.lower().split()).encode("utf-8")).hexdigest()
+
+    def lookup(self, question: str,
+               embed_query: Callable[[str], np.ndarray]) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """Return (cached result, query embedding); the question is only embedded on an exact miss."""
+        key = self._hash(question)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return {"answer": entry[0], "sources": entry[1]}, None
+
+        q_emb = np.asarray(embed_query(question), dtype=np.float32)
+
+        with self._lock:
+            if self._emb_keys:
+                top, scores = topk_cosine(self._emb_matrix[:len(self._emb_keys)], q_emb, 1)
+                if scores[0] >= self.similarity_threshold:
+                    best_key = self._emb_keys[int(top[0])]
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    answer, sources, _ = self._entries[best_key]
+                    return {"answer": answer, "sources": sources}, q_emb
+
+            self.misses += 1
+        return None, q_emb
+
+    def set(self, question: str, q_emb: np.ndarray, answer: str, sources: List[str]):
+        """Cache an answer under the question and its embedding."""
+        key = self._hash(question)
+        with self._lock:
+            self._entries[key] = (answer, sources, time.time())
+            self._entries.move_to_end(key)
+            self._store_embedding(key, self._normalize(np.asarray(q_emb, dtype=np.float32)))
+            while len(self._entries) > self.max_size:
+                old_key, _ = self._entries.popitem(last=False)
+                self._drop_embedding(old_key)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached answer, e.g. when the underlying document changes."""
+        with self._lock:
+            self._entries.clear()
+            self._emb_matrix = None
+            self._emb_keys = []
+            self._rows = {}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        # Entries are kept in recency order, but timestamps are insertion times, so scan all
+        expired = [k for k, entry in self._entries.items() if entry[2] < cutoff]
+        for k in expired:
+            del self._entries[k]
+            self._drop_embedding(k)
+            self.evictions += 1
+
+    @staticmethod
+    def _normalize(vec: np.ndarray) -> np.ndarray:
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _store_embedding(self, key: str, unit_emb: np.ndarray):
+        row = self._rows.get(key)
+        if row is not None:
+            self._emb_matrix[row] = unit_emb
+            return
+
+        row = len(self._emb_keys)
+        if self._emb_matrix is None:
+            self._emb_matrix = np.empty((16, unit_emb.shape[0]), dtype=np.float32)
+        elif row == self._emb_matrix.shape[0]:
+            # Grow geometrically so inserts stay amortised O(d)
+            self._emb_matrix = np.vstack([self._emb_matrix, np.empty_like(self._emb_matrix)])
+        self._emb_matrix[row] = unit_emb
+        self._emb_keys.append(key)
+        self._rows[key] = row
+
+    def _drop_embedding(self, key: str):
+        # Swap the last row into the freed slot to keep the live rows contiguous
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._emb_keys) - 1
+        if row != last:
+            last_key = self._emb_keys[last]
+            self._emb_matrix[row] = self._emb_matrix[last]
+            self._emb_keys[row] = last_key
+            self._rows[last_key] = row
+        self._emb_keys.pop()
@@ -1,19 +1,88 @@
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
-from typing import List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import functools
 import os
+import pickle
+import shutil
+import threading
+import time
+import uuid
+import faiss
+import numpy as np
+
+from app.utils.embeddings import get_embeddings
+from app.utils.document_processor import has_text, unique_chunks
+
+# Shared across managers: each StandardGpuResources reserves its own scratch memory on the device
+_gpu_res = None
+_gpu_lock = threading.Lock()
+
+
+def set_search_threads(num_threads: int):
+    """Cap FAISS's OpenMP pool so concurrent sessions don't each spawn one thread per core."""
+    if num_threads > 0:
+        faiss.omp_set_num_threads(num_threads)
+
+
+def _gpu_resources():
+    """Return the process-wide GPU resources, or None on CPU-only FAISS builds."""
+    global _gpu_res
+    if getattr(faiss, "get_num_gpus", lambda: 0)() == 0:
+        return None
+    with _gpu_lock:
+        if _gpu_res is None:
+            _gpu_res = faiss.StandardGpuResources()
+        return _gpu_res
 
 
 class VectorStoreManager:
-    def __init__(self, embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        # IMPROVED: Better embedding model (optional upgrade)
-        # You can also use: "sentence-transformers/all-mpnet-base-v2" for better quality
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}  # NEW: Normalize for better similarity
-        )
+    # Below this many vectors a flat scan is as fast as HNSW and exact
+    HNSW_MIN_VECTORS = 500
+    HNSW_M = 32
+    HNSW_EF_CONSTRUCTION = 200
+    HNSW_EF_SEARCH = 64
+    # IVF-PQ needs enough vectors to train its 256 codewords per sub-quantizer
+    LARGE_SCALE_MIN_VECTORS = 10000
+    # k-means gains nothing from more than ~256 training points per IVF list
+    IVF_TRAIN_POINTS_PER_LIST = 256
+    # ...and warns below 39 per list, which 4*sqrt(N) lists would break near the 10k threshold
+    IVF_MIN_POINTS_PER_LIST = 39
+    # Distinct query strings whose embeddings are kept per manager
+    QUERY_CACHE_SIZE = 1024
+    # Searches with k up to this reuse per-thread result buffers
+    MAX_K = 32
+
+    def __init__(self, embedding_model: str = "BAAI/bge-small-en-v1.5",
+                 embeddings: Optional[Embeddings] = None, quantization: str = "none",
+                 hnsw_m: int = HNSW_M, ef_search: int = HNSW_EF_SEARCH,
+                 ef_construction: int = HNSW_EF_CONSTRUCTION, large_scale: bool = False):
+        # Share a pre-built model when given one; loading it per manager costs seconds and hundreds of MB
+        self.embeddings = embeddings if embeddings is not None else get_embeddings(embedding_model)
+        # How stored vectors are encoded: "none" (float32), "fp16" or "sq8" (8-bit scalar quantizer)
+        self.quantization = quantization
+        # HNSW graph degree and build/search beam widths (higher = better recall, slower)
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.ef_construction = ef_construction
+        # Compress big corpora with IVF + product quantization (~64 B per vector instead of 4 per dim)
+        self.large_scale = large_scale
+        self._gpu_res = _gpu_resources()
+        # Set when the index's IVF lists are a read-only memory map of a saved store;
+        # _mapped_file keeps that file readable even if a later save replaces it.
+        # Every path that writes or re-serialises the index goes through _read_mapped_index
+        # or _serialize_index instead of touching the mapped index directly
+        self._mmapped = False
+        self._mapped_file = None
+        self._embed_query_cached = functools.lru_cache(maxsize=self.QUERY_CACHE_SIZE)(self._encode_query)
+        # Per-thread scratch buffers for the query and FAISS results; Streamlit sessions share managers
+        self._scratch = threading.local()
+        # Saves run here, one at a time, so ingest requests don't wait on disk writes
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aida-faiss-save")
         self.vector_store: Optional[FAISS] = None
 
     def create_vector_store(self, documents: List[Document]) -> FAISS:
@@ -23,47 +92,328 @@ class VectorStoreManager:
             if not documents:
                 raise ValueError("Cannot create vector store with empty document list")
 
-            # NEW: Filter out empty documents
-            valid_docs = [doc for doc in documents if doc.page_content.strip()]
+            # NEW: Filter out empty and duplicate documents
+            valid_docs = unique_chunks([doc for doc in documents if has_text(doc.page_content)])
 
             if not valid_docs:
                 raise ValueError("No valid documents with content found")
 
-            self.vector_store = FAISS.from_documents(
-                documents=valid_docs,
-                embedding=self.embeddings
+            return self.create_vector_store_from_embeddings(
+                valid_docs,
+                self.embed_documents([doc.page_content for doc in valid_docs])
+            )
+
+        except Exception as e:
+            raise Exception(f"Error creating vector store: {str(e)}")
+
+    def create_vector_store_from_embeddings(self, documents: List[Document], embeddings: np.ndarray) -> FAISS:
+        """Create a new vector store from documents and their precomputed embeddings."""
+        try:
+            if not documents:
+                raise ValueError("Cannot create vector store with empty document list")
+            if len(documents) != len(embeddings):
+                raise ValueError("Got a different number of documents and embeddings")
+
+            index = self._to_device(self._build_index(np.ascontiguousarray(embeddings, dtype=np.float32)))
+            doc_ids = [str(uuid.uuid4()) for _ in documents]
+            self._release_mapped_file()
+            self.vector_store = FAISS(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=InMemoryDocstore(dict(zip(doc_ids, documents))),
+                index_to_docstore_id=dict(enumerate(doc_ids)),
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
             )
             return self.vector_store
 
         except Exception as e:
             raise Exception(f"Error creating vector store: {str(e)}")
 
+    def _to_device(self, index: faiss.Index) -> faiss.Index:
+        """Move a trained CPU index onto the GPU when one is available."""
+        if self._gpu_res is None:
+            return index
+        try:
+            return faiss.index_cpu_to_gpu(self._gpu_res, 0, index)
+        except Exception:
+            # Not every index type has a GPU implementation (HNSW doesn't); keep it on CPU
+            return index
+
+    def _build_index(self, vectors: np.ndarray) -> faiss.Index:
+        """Build a FAISS index over unit-normalised vectors: IVF-PQ, HNSW or flat depending on size."""
+        dim = vectors.shape[1]
+        # Embeddings are normalised, so inner product ranks exactly like cosine (and like L2)
+        metric = faiss.METRIC_INNER_PRODUCT
+        quantizers = {
+            "fp16": faiss.ScalarQuantizer.QT_fp16,  # half the bytes per vector
+            "sq8": faiss.ScalarQuantizer.QT_8bit,   # a quarter, with per-dimension ranges
+        }
+
+        qtype = quantizers.get(self.quantization)
+        if self.large_scale and len(vectors) >= self.LARGE_SCALE_MIN_VECTORS:
+            nlist = min(int(4 * np.sqrt(len(vectors))), len(vectors) // self.IVF_MIN_POINTS_PER_LIST)
+            index = faiss.index_factory(dim, f"IVF{nlist},PQ{self._pq_subquantizers(dim)}x8", metric)
+            sample_size = self.IVF_TRAIN_POINTS_PER_LIST * nlist
+            if sample_size < len(vectors):
+                # Fixed seed so rebuilding the same corpus gives the same index
+                sample = np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)
+                index.train(vectors[np.sort(sample)])
+            else:
+                index.train(vectors)  # Small enough to train on as is, without a copy
+            ivf = faiss.extract_index_ivf(index)
+            ivf.nprobe = max(1, nlist // 32)
+            # Lets search_with_vectors reconstruct candidates by id; unlike the array map,
+            # the hashtable one also accepts the explicit ids add_documents assigns
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        elif len(vectors) >= self.HNSW_MIN_VECTORS:
+            # Graph-based ANN: logarithmic search cost instead of a linear scan
+            if qtype is not None:
+                index = faiss.IndexHNSWSQ(dim, qtype, self.hnsw_m, metric)
+            else:
+                index = faiss.IndexHNSWFlat(dim, self.hnsw_m, metric)
+            index.hnsw.efConstruction = self.ef_construction
+            index.hnsw.efSearch = self.ef_search
+        elif qtype is not None:
+            index = faiss.IndexScalarQuantizer(dim, qtype, metric)
+        else:
+            index = faiss.IndexFlatIP(dim)
+
+        # Scalar quantizers learn per-dimension ranges; flat indexes are already trained
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        return index
+
+    @staticmethod
+    def _pq_subquantizers(dim: int) -> int:
+        """Largest sub-quantizer count that divides dim with at least 8 dims each (48 for 384-d)."""
+        for m in range(min(64, dim // 8), 0, -1):
+            if dim % m == 0:
+                return m
+        return 1
+
+    def embed_documents(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts into a C-contiguous (n, dim) float32 matrix, ready for FAISS as is."""
+        return np.ascontiguousarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
     def add_documents(self, documents: List[Document]):
         """Add new documents to existing vector store."""
         if self.vector_store is None:
             self.create_vector_store(documents)
         else:
-            # Filter empty documents
-            valid_docs = [doc for doc in documents if doc.page_content.strip()]
+            # Filter empty and duplicate documents
+            valid_docs = unique_chunks([doc for doc in documents if has_text(doc.page_content)])
             if valid_docs:
-                self.vector_store.add_documents(valid_docs)
+                if self._mmapped:
+                    # Mapped inverted lists can be neither appended to nor cloned; read the file into memory
+                    self.vector_store.index = self._read_mapped_index()
+
+                # Embed the new chunks as one float32 batch, then hand FAISS the finished vectors
+                self._add_vectors(valid_docs, self.embed_documents([doc.page_content for doc in valid_docs]))
+
+    def _add_vectors(self, documents: List[Document], vectors: np.ndarray):
+        """Append embedded documents to the live index under the next free ids; nothing is rebuilt."""
+        # FAISS's SWIG glue silently copies anything that isn't C-contiguous float32
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index = self.vector_store.index
+        start = index.ntotal
+        ids = np.arange(start, start + len(vectors), dtype=np.int64)
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and ivf.direct_map.type != faiss.DirectMap.Array:
+            # Trained IVF lists take new vectors in place: O(new vectors), no retraining
+            index.add_with_ids(vectors, ids)
+        else:
+            # Flat and HNSW indexes number vectors sequentially, which is exactly ids
+            index.add(vectors)
+
+        doc_ids = [str(uuid.uuid4()) for _ in documents]
+        self.vector_store.docstore.add(dict(zip(doc_ids, documents)))
+        self.vector_store.index_to_docstore_id.update(zip(ids.tolist(), doc_ids))
 
     def similarity_search(self, query: str, k: int = 4) -> List[Document]:
         """Search for similar documents."""
         if self.vector_store is None:
             raise Exception("Vector store not initialized")
-        return self.vector_store.similarity_search(query, k=k)
+        return self.similarity_search_by_vector(self.embed_query(query), k=k)
 
-    def save_local(self, path: str):
-        """Save vector store locally."""
-        if self.vector_store:
-            self.vector_store.save_local(path)
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query string into a float32 vector, reusing the result for repeated queries."""
+        # Whitespace never changes the tokens; case can for cased models, so it is kept
+        return self._embed_query_cached(" ".join(query.split()))
+
+    def _encode_query(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        # Shared between callers through the LRU, so make accidental in-place edits fail loudly
+        vector.setflags(write=False)
+        return vector
+
+    def similarity_search_by_vector(self, embedding: np.ndarray, k: int = 4) -> List[Document]:
+        """Search for similar documents using a precomputed query embedding."""
+        return [self._docstore_lookup(i) for i in self._search_ids(embedding, k)]
+
+    def similarity_search_batch(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """Search for several queries at once: one embedding batch and one FAISS search call."""
+        if self.vector_store is None:
+            raise Exception("Vector store not initialized")
+        if not queries:
+            return []
+
+        query_matrix = self.embed_documents(queries)
+        _, labels = self.vector_store.index.search(query_matrix, k)
+        return [[self._docstore_lookup(int(i)) for i in row if i != -1] for row in labels]
+
+    def search_with_vectors(self, embedding: np.ndarray, k: int = 4) -> Tuple[List[Document], np.ndarray]:
+        """Return the top-k documents for a query vector along with their stored (dequantized) vectors."""
+        ids = self._search_ids(embedding, k)
+        index = self.vector_store.index
+        docs = [self._docstore_lookup(i) for i in ids]
+        if not ids:
+            return docs, np.empty((0, index.d), dtype=np.float32)
+        try:
+            vectors = np.vstack([index.reconstruct(i) for i in ids])
+        except Exception:
+            # Some GPU indexes can't reconstruct; re-embedding k texts is cheap by comparison
+            vectors = self.embed_documents([doc.page_content for doc in docs])
+        return docs, vectors
+
+    def _search_ids(self, embedding: np.ndarray, k: int) -> List[int]:
+        """Run a raw FAISS search, reusing this thread's query and result buffers."""
+        if self.vector_store is None:
+            raise Exception("Vector store not initialized")
+
+        index = self.vector_store.index
+        scratch = self._scratch
+        if getattr(scratch, "query", None) is None or scratch.query.shape[1] != index.d:
+            scratch.query = np.empty((1, index.d), dtype=np.float32)
+            scratch.distances = np.empty((1, self.MAX_K), dtype=np.float32)
+            scratch.labels = np.empty((1, self.MAX_K), dtype=np.int64)
+        scratch.query[0] = embedding
+
+        if k <= self.MAX_K:
+            distances, labels = scratch.distances[:, :k], scratch.labels[:, :k]
+            index.search(scratch.query, k, D=distances, I=labels)
+        else:
+            _, labels = index.search(scratch.query, k)
+        return [int(i) for i in labels[0] if i != -1]
+
+    def _docstore_lookup(self, faiss_id: int) -> Document:
+        return self.vector_store.docstore.search(self.vector_store.index_to_docstore_id[faiss_id])
+
+    def save_local(self, path: str) -> Optional[Future]:
+        """Save vector store locally in the background; returns a Future for the write."""
+        if not self.vector_store:
+            return None
+        # Snapshot in the caller's thread so later add_documents calls can't race the writer
+        index_bytes = self._serialize_index()
+        docstore = InMemoryDocstore(dict(self.vector_store.docstore._dict))
+        index_to_docstore_id = dict(self.vector_store.index_to_docstore_id)
+        future = self._io_pool.submit(self._do_save, path, index_bytes, docstore, index_to_docstore_id)
+        future.add_done_callback(self._report_save_error)
+        return future
+
+    def _serialize_index(self) -> np.ndarray:
+        """Return the index as self-contained bytes, with its inverted lists embedded."""
+        if self._mmapped:
+            # Serialising mapped lists would only write a reference to the old version's file, which
+            # a later save prunes. The map is never written to, so the file's bytes are the index as is
+            self._mapped_file.seek(0)
+            return np.frombuffer(self._mapped_file.read(), dtype=np.uint8)
+
+        index = self.vector_store.index
+        if self._gpu_res is not None and hasattr(faiss, "index_gpu_to_cpu"):
+            # FAISS can only serialise CPU indexes
+            try:
+                index = faiss.index_gpu_to_cpu(index)
+            except Exception:
+                pass  # Already a CPU index
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None and isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.OnDiskInvertedLists):
+            # Would reference another file instead of embedding the lists; mapped stores go through the branch above
+            raise Exception("Error saving vector store: index still uses memory-mapped inverted lists")
+        return faiss.serialize_index(index)
+
+    @staticmethod
+    def _report_save_error(future: Future):
+        # Callers rarely wait on the Future, so make failed background saves visible here
+        if future.exception() is not None:
+            print(f"❌ {future.exception()}")
+
+    @staticmethod
+    def _do_save(path: str, index_bytes: np.ndarray, docstore: InMemoryDocstore, index_to_docstore_id: dict):
+        """Write a new version directory next to path, then atomically repoint the path symlink at it."""
+        path = os.path.normpath(path)
+        parent, name = os.path.split(os.path.abspath(path))
+        version_dir = f"{path}.v{time.time_ns()}"
+        link_tmp = f"{path}.link-{uuid.uuid4().hex}"
+        os.makedirs(version_dir)
+        try:
+            # Same layout as FAISS.save_local, so load_local (and LangChain) read it unchanged
+            with open(os.path.join(version_dir, "index.faiss"), "wb") as f:
+                f.write(index_bytes.tobytes())
+            with open(os.path.join(version_dir, "index.pkl"), "wb") as f:
+                pickle.dump((docstore, index_to_docstore_id), f)
+
+            if os.path.isdir(path) and not os.path.islink(path):
+                # Store saved before versioning: turn it into a version once (the only non-atomic step)
+                os.replace(path, f"{path}.v0")
+            # A relative target keeps the store valid if the parent directory moves
+            os.symlink(os.path.basename(version_dir), link_tmp)
+            os.replace(link_tmp, path)
+        except Exception as e:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            if os.path.lexists(link_tmp):
+                os.unlink(link_tmp)
+            raise Exception(f"Error saving vector store: {str(e)}")
+
+        # Keep the version just replaced for readers that resolved the link before the swap
+        prefix = f"{name}.v"
+        versions = sorted(int(v[len(prefix):]) for v in os.listdir(parent)
+                          if v.startswith(prefix) and v[len(prefix):].isdigit())
+        for stale in versions[:-2]:
+            shutil.rmtree(os.path.join(parent, f"{prefix}{stale}"), ignore_errors=True)
 
     def load_local(self, path: str):
         """Load vector store from local storage."""
-        if os.path.exists(path):
-            self.vector_store = FAISS.load_local(
-                path,
-                self.embeddings,
-                allow_dangerous_deserialization=True
+        index_path = os.path.join(path, "index.faiss")
+        if os.path.exists(index_path):
+            # Held open before mapping so the first write can re-read exactly this file
+            mapped_file = open(os.path.realpath(index_path), "rb")
+            # Memory-map instead of reading the whole file: IVF inverted lists are paged in on demand
+            # and shared between processes that load the same store (other index types load fully)
+            index = faiss.read_index(mapped_file.name, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            with open(os.path.join(path, "index.pkl"), "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+
+            # Search breadth is a runtime knob; apply this manager's setting to the loaded graph
+            hnsw = getattr(index, "hnsw", None)
+            if hnsw is not None:
+                hnsw.efSearch = self.ef_search
+
+            device_index = self._to_device(index)
+            self.vector_store = FAISS(
+                embedding_function=self.embeddings,
+                index=device_index,
+                docstore=docstore,
+                index_to_docstore_id=index_to_docstore_id,
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
             )
+            self._release_mapped_file()
+            # Copying to the GPU already materialised the index in device memory
+            if faiss.try_extract_index_ivf(index) is not None and device_index is index:
+                self._mmapped = True
+                self._mapped_file = mapped_file
+            else:
+                mapped_file.close()
+
+    def _read_mapped_index(self) -> faiss.Index:
+        """Read the memory-mapped store's index file again, this time fully into writable memory."""
+        self._mapped_file.seek(0)
+        index = faiss.read_index(faiss.PyCallbackIOReader(self._mapped_file.read))
+        self._release_mapped_file()
+        return index
+
+    def _release_mapped_file(self):
+        if self._mapped_file is not None:
+            self._mapped_file.close()
+            self._mapped_file = None
+        self._mmapped = False
@@ -0,0 +1,94 @@
+import os
+import sys
+import zlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+faiss = pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain_huggingface")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.utils.vector_store import VectorStoreManager
+
+DIM = 32
+NUM_VECTORS = 4000
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic unit vectors per text, so tests never load a real model."""
+
+    def _vector(self, text: str) -> list:
+        vec = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIM).astype(np.float32)
+        return (vec / np.linalg.norm(vec)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _ivf_manager() -> VectorStoreManager:
+    manager = VectorStoreManager(embeddings=HashEmbeddings(), large_scale=True)
+    manager.LARGE_SCALE_MIN_VECTORS = NUM_VECTORS
+    return manager
+
+
+def _build_ivf_store(manager: VectorStoreManager) -> np.ndarray:
+    vectors = np.random.default_rng(0).standard_normal((NUM_VECTORS, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    docs = [Document(page_content=f"chunk {i}") for i in range(NUM_VECTORS)]
+    manager.create_vector_store_from_embeddings(docs, vectors)
+    assert faiss.try_extract_index_ivf(manager.vector_store.index) is not None
+    return vectors
+
+
+def _contents(docs):
+    return [doc.page_content for doc in docs]
+
+
+def test_resaving_a_mapped_store_survives_pruning(tmp_path):
+    path = str(tmp_path / "store")
+    manager = _ivf_manager()
+    vectors = _build_ivf_store(manager)
+    expected = _contents(manager.similarity_search_by_vector(vectors[0], k=10))
+    manager.save_local(path).result()
+
+    reloaded = _ivf_manager()
+    reloaded.load_local(path)
+    # Re-saving from the mapped index, then twice more, prunes the version it was loaded from
+    reloaded.save_local(path).result()
+    reloaded.save_local(path).result()
+    reloaded.save_local(path).result()
+
+    final = _ivf_manager()
+    final.load_local(path)
+    assert _contents(final.similarity_search_by_vector(vectors[0], k=10)) == expected
+
+
+def test_mapped_ivf_store_accepts_new_documents(tmp_path):
+    path = str(tmp_path / "store")
+    manager = _ivf_manager()
+    _build_ivf_store(manager)
+    manager.save_local(path).result()
+
+    reloaded = _ivf_manager()
+    reloaded.load_local(path)
+    assert reloaded._mmapped
+
+    reloaded.add_documents([Document(page_content="new chunk")])
+    assert not reloaded._mmapped
+    assert reloaded.vector_store.index.ntotal == NUM_VECTORS + 1
+    assert "new chunk" in _contents(reloaded.similarity_search("new chunk", k=10))
+
+    # The re-read index is fully in memory, so it saves and reloads on its own
+    reloaded.save_local(path).result()
+    final = _ivf_manager()
+    final.load_local(path)
+    assert final.vector_store.index.ntotal == NUM_VECTORS + 1